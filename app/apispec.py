@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+
+from flasgger import Swagger
+from flask import current_app
+
+# Bump when the layout of the prebuilt file changes
+ARTIFACT_VERSION = 1
+
+
+def route_table_hash(app):
+    """
+    Fingerprint of everything the spec is generated from.
+
+    Covers each rule, its methods and its view's docstring, so editing a
+    route's YAML invalidates a prebuilt spec just like adding a route does.
+    """
+    digest = hashlib.sha1()
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: (rule.rule, rule.endpoint)):
+        view = app.view_functions.get(rule.endpoint)
+        digest.update(f'{rule.rule}|{sorted(rule.methods)}|{rule.endpoint}|'.encode())
+        digest.update((getattr(view, '__doc__', None) or '').encode())
+    return digest.hexdigest()
+
+
+class PrebuiltSwagger(Swagger):
+    """
+    Swagger that serves a spec built ahead of time by ``flask build-spec``.
+
+    Generating the spec parses the YAML in every route docstring, which each
+    worker would otherwise redo on its first /apispec hit (and on every hit
+    in debug mode). The prebuilt file is used when its route hash matches
+    the running app; otherwise the spec is generated once and memoized under
+    the current hash. With APISPEC_PARSE_DOCSTRINGS off (production), the
+    docstrings are never parsed: a stale file is served with a warning and a
+    missing one yields an empty spec.
+    """
+
+    def init_app(self, app, decorators=None):
+        app.config.setdefault('APISPEC_FILE', os.path.join(app.instance_path, 'apispec.json'))
+        app.config.setdefault('APISPEC_PARSE_DOCSTRINGS', True)
+        # Route hash, memoized specs and the loaded file, per app
+        app.extensions['apispec'] = {'route_hash': None, 'memo': {}, 'prebuilt': None}
+        super().init_app(app, decorators)
+
+    def get_apispecs(self, endpoint='apispec_1'):
+        state = current_app.extensions['apispec']
+        if state['route_hash'] is None:
+            # The route table is frozen once the app serves requests
+            state['route_hash'] = route_table_hash(current_app)
+        if endpoint in state['memo']:
+            return state['memo'][endpoint]
+
+        prebuilt = self._load_prebuilt(state)
+        if prebuilt is not None and endpoint in prebuilt['specs']:
+            if prebuilt['route_hash'] == state['route_hash']:
+                spec = prebuilt['specs'][endpoint]
+            elif not current_app.config['APISPEC_PARSE_DOCSTRINGS']:
+                current_app.logger.warning('Serving a stale API spec from %s; '
+                                           'run `flask build-spec`', self._file())
+                spec = prebuilt['specs'][endpoint]
+            else:
+                spec = self.generate(endpoint)
+        elif not current_app.config['APISPEC_PARSE_DOCSTRINGS']:
+            current_app.logger.warning('No prebuilt API spec at %s and docstring parsing '
+                                       'is off; serving an empty spec', self._file())
+            spec = {'swagger': '2.0', 'info': {'title': self.config.get('title', ''),
+                                               'version': '0.0.1'}, 'paths': {}}
+        else:
+            spec = self.generate(endpoint)
+        state['memo'][endpoint] = spec
+        return spec
+
+    def generate(self, endpoint='apispec_1'):
+        """Build the spec from the route docstrings, bypassing every cache."""
+        self.apispecs.pop(endpoint, None)
+        return super().get_apispecs(endpoint)
+
+    def build(self, app):
+        """Generate every configured spec and write them to APISPEC_FILE; returns the path."""
+        with app.test_request_context():
+            artifact = {
+                'version': ARTIFACT_VERSION,
+                'route_hash': route_table_hash(app),
+                'specs': {spec['endpoint']: self.generate(spec['endpoint'])
+                          for spec in self.config['specs']},
+            }
+        path = app.config['APISPEC_FILE']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(artifact, f, sort_keys=True, separators=(',', ':'))
+        return path
+
+    def _file(self):
+        return current_app.config['APISPEC_FILE']
+
+    def _load_prebuilt(self, state):
+        if state['prebuilt'] is None:
+            try:
+                with open(self._file()) as f:
+                    artifact = json.load(f)
+            except (OSError, ValueError):
+                artifact = {}
+            state['prebuilt'] = artifact if artifact.get('version') == ARTIFACT_VERSION else False
+        return state['prebuilt'] or None
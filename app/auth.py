@@ -0,0 +1,221 @@
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+# OWASP's recommendation for PBKDF2-HMAC-SHA256
+PASSWORD_HASH_ITERATIONS = 600000
+TOKEN_SALT = 'auth-token'
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS, salt=None):
+    """
+    PBKDF2-HMAC-SHA256 of ``password``; returns ``(password_hash, salt)`` for the user row.
+
+    The salt column carries the iteration count as ``<iterations>$<salt>``, so
+    raising PASSWORD_HASH_ITERATIONS later leaves existing hashes verifiable.
+    """
+    salt = salt or _b64(os.urandom(16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+    return _b64(digest), f'{iterations}${salt}'
+
+
+def check_password(password, password_hash, salt):
+    iterations, _, raw_salt = salt.partition('$')
+    if not iterations.isdigit() or not raw_salt:
+        return False
+    expected, _ = hash_password(password, int(iterations), raw_salt)
+    return hmac.compare_digest(expected, password_hash)
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing pool is too busy to take a request in time."""
+
+
+class Auth:
+    """
+    Password hashing and stateless signed bearer tokens.
+
+    Login checks a deliberately slow password hash on a pool of
+    AUTH_HASH_WORKERS threads: at most that many hashes run at once, and a
+    login that cannot start within AUTH_HASH_TIMEOUT seconds gets a 503
+    rather than holding a request thread indefinitely. Tokens are signed with
+    SECRET_KEY and expire after AUTH_TOKEN_MAX_AGE seconds; checking one
+    needs no database access, and the last AUTH_TOKEN_CACHE_SIZE verified
+    tokens skip even the signature check. Tokens cannot be revoked before
+    they expire.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUTH_REQUIRED', False)
+        app.config.setdefault('AUTH_TOKEN_MAX_AGE', 30 * 86400)
+        app.config.setdefault('AUTH_TOKEN_CACHE_SIZE', 4096)
+        app.config.setdefault('AUTH_HASH_WORKERS', 2)
+        app.config.setdefault('AUTH_HASH_TIMEOUT', 10)
+        app.config.setdefault('PASSWORD_HASH_ITERATIONS', PASSWORD_HASH_ITERATIONS)
+        if not app.config.get('SECRET_KEY'):
+            # Shared by pre-forked workers, but tokens die with the process
+            app.logger.warning('SECRET_KEY is not set; auth tokens will not survive a restart')
+            app.config['SECRET_KEY'] = os.urandom(32).hex()
+        app.extensions['auth'] = _Tokens(app)
+
+    @staticmethod
+    def _tokens():
+        return current_app.extensions['auth']
+
+    def hash_password(self, password):
+        """``(password_hash, salt)`` for a new password, computed on the hashing pool."""
+        return self._tokens().hash_password(password)
+
+    def check_password(self, password, password_hash, salt):
+        """True if ``password`` matches; computed on the hashing pool."""
+        return self._tokens().check_password(password, password_hash, salt)
+
+    def issue_token(self, user_id):
+        return self._tokens().issue_token(user_id)
+
+    def verify_token(self, token):
+        """The user ID a valid, unexpired token was issued for, else None."""
+        return self._tokens().verify_token(token)
+
+
+class _Tokens:
+    """The signer, hashing pool and verified-token cache of one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+        self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT)
+        self._pool = ThreadPoolExecutor(app.config['AUTH_HASH_WORKERS'],
+                                        thread_name_prefix='password-hash')
+
+    def hash_password(self, password):
+        return self._run(hash_password, password, self.app.config['PASSWORD_HASH_ITERATIONS'])
+
+    def check_password(self, password, password_hash, salt):
+        return self._run(check_password, password, password_hash, salt)
+
+    def issue_token(self, user_id):
+        return self._serializer.dumps({'uid': user_id})
+
+    def verify_token(self, token):
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(token)
+            if cached is not None:
+                user_id, expires_at = cached
+                if now < expires_at:
+                    self._verified.move_to_end(token)
+                    return user_id
+                del self._verified[token]
+
+        max_age = self.app.config['AUTH_TOKEN_MAX_AGE']
+        try:
+            payload, signed_at = self._serializer.loads(token, max_age=max_age,
+                                                        return_timestamp=True)
+            user_id = int(payload['uid'])
+        except (BadSignature, SignatureExpired, KeyError, TypeError, ValueError):
+            return None
+
+        with self._lock:
+            self._verified[token] = (user_id, signed_at.timestamp() + max_age)
+            while len(self._verified) > self.app.config['AUTH_TOKEN_CACHE_SIZE']:
+                self._verified.popitem(last=False)
+        return user_id
+
+    def _run(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        try:
+            return future.result(timeout=self.app.config['AUTH_HASH_TIMEOUT'])
+        except TimeoutError:
+            future.cancel()
+            raise HashingBusy() from None
+
+
+def query_token(view):
+    """
+    Also accept the token as ``?access_token=`` for ``view``.
+
+    Only for event streams: EventSource cannot send headers, and a token in
+    the URL ends up in access logs and browser history.
+    """
+    view.accepts_query_token = True
+    return view
+
+
+def request_token():
+    """The bearer token sent with the request, or ``?access_token=`` on ``query_token`` views."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token.strip()
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, 'accepts_query_token', False):
+        return request.args.get('access_token')
+    return None
+
+
+def get_user_id():
+    """The ID of the user the request's token was issued for, or None without a valid one."""
+    if 'auth_user_id' not in g:
+        token = request_token()
+        g.auth_user_id = current_app.extensions['auth'].verify_token(token) if token else None
+    return g.auth_user_id
+
+
+def may_act_for(user_id):
+    """
+    False if the request's token was issued to a user other than ``user_id``.
+
+    Views addressing rows by ID check the row's owner with it, and views
+    taking a ``user_id`` in the body or query check that; token-less
+    requests pass, as ``authenticated`` has already refused them if needed.
+    """
+    token_user = get_user_id()
+    return token_user is None or user_id == token_user
+
+
+def authenticated(view):
+    """
+    Refuse an invalid token with 401, and a missing one when AUTH_REQUIRED is set.
+
+    Requests without a token are let through otherwise, so clients can move to
+    tokens before AUTH_REQUIRED is switched on.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if get_user_id() is None:
+            if request_token() is not None:
+                return jsonify({'message': 'Invalid or expired token'}), 401
+            if current_app.config['AUTH_REQUIRED']:
+                return jsonify({'message': 'Authentication required'}), 401
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def authorized(view):
+    """``authenticated``, and a token for another user than the ``user_id`` URL parameter gets 403."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not may_act_for(kwargs['user_id']):
+            return jsonify({'message': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+
+    return authenticated(wrapper)
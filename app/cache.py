@@ -0,0 +1,216 @@
+import hashlib
+import hmac
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from multiprocessing.managers import BaseManager
+
+from flask import current_app, make_response, request
+
+from app.auth import get_user_id
+from app.versioning import table_version
+
+
+class LocalCache:
+    """
+    Bounded LRU cache with a per-entry TTL, safe to share between threads.
+
+    A ``flask cache-server`` process hosts one of these for SharedCache
+    clients, so its public methods only take and return picklable values.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, *prefixes):
+        """Drop every key starting with one of ``prefixes``; returns how many went."""
+        with self._lock:
+            doomed = [key for key in self._entries if key.startswith(prefixes)]
+            for key in doomed:
+                del self._entries[key]
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class _CacheManager(BaseManager):
+    pass
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def shared_cache_settings(config):
+    """
+    ``(address, authkey)`` for the shared cache, refusing unsafe settings.
+
+    The server unpickles whatever its clients send, so anyone who can connect
+    with the key can run code in it. It therefore only listens on a Unix
+    socket (a path) or a loopback address. It also needs a per-deployment
+    key: RESPONSE_CACHE_AUTHKEY, or one derived from SECRET_KEY.
+    """
+    address = config['RESPONSE_CACHE_ADDRESS']
+    if not isinstance(address, str):
+        # Loaded from the environment as a JSON list
+        address = tuple(address)
+        if not _is_loopback(address[0]):
+            raise ValueError('RESPONSE_CACHE_ADDRESS must be a Unix socket path or a loopback '
+                             f'address, not {address[0]!r}')
+    authkey = config['RESPONSE_CACHE_AUTHKEY']
+    if not authkey:
+        raise ValueError('The shared response cache needs RESPONSE_CACHE_AUTHKEY or SECRET_KEY')
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    return address, authkey
+
+
+def serve_shared_cache(address, authkey, max_entries=1024, ttl=60):
+    """Host one LocalCache for every worker on this machine; blocks forever."""
+    cache = LocalCache(max_entries, ttl)
+    _CacheManager.register('cache', callable=lambda: cache)
+    manager = _CacheManager(address=address, authkey=authkey)
+    manager.get_server().serve_forever()
+
+
+class SharedCache:
+    """Client for a cache hosted by ``flask cache-server``; same API as LocalCache."""
+
+    def __init__(self, address, authkey):
+        _CacheManager.register('cache')
+        manager = _CacheManager(address=address, authkey=authkey)
+        manager.connect()
+        self._cache = manager.cache()
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized 200 responses.
+
+    Keys are ``<name>?<query string>|<Accept>|<counter>``, where ``name``
+    identifies the resource (``podcast:5``) or listing (``podcasts``) and
+    ``counter`` is the change counter of the table it is read from, so an
+    entry is never served once the table has been written to, even by
+    another process. ``invalidate(name)`` removes exactly the variants of
+    that resource, freeing their space early. With caching off, the app's
+    backend is None.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'local')
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_ADDRESS', ('127.0.0.1', 50111))
+        # Before Auth fills in a random per-process SECRET_KEY, which the
+        # cache server (another process) could not share
+        secret = app.config.get('SECRET_KEY')
+        if secret:
+            if isinstance(secret, str):
+                secret = secret.encode()
+            secret = hmac.new(secret, b'response-cache', hashlib.sha256).digest()
+        app.config.setdefault('RESPONSE_CACHE_AUTHKEY', secret or None)
+
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend == 'local':
+            app.extensions['response_cache'] = LocalCache(app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+                                                          app.config['RESPONSE_CACHE_TTL'])
+        elif backend == 'shared':
+            app.extensions['response_cache'] = SharedCache(*shared_cache_settings(app.config))
+        elif backend is None:
+            app.extensions['response_cache'] = None
+        else:
+            raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {backend!r}')
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def cached(self, name, table, per_user=False):
+        """
+        Cache a GET view reading ``table``; ``name`` is formatted with the view's arguments.
+
+        With ``per_user`` the token's user is part of the key, for views whose
+        response depends on it.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                backend = self.backend
+                if backend is None:
+                    return view(*args, **kwargs)
+
+                query = request.query_string.decode()
+                counter, _ = table_version(table)
+                key = (f"{name.format(**kwargs)}?{query}|{request.headers.get('Accept', '')}"
+                       f"|{counter}")
+                if per_user:
+                    key += f'|{get_user_id()}'
+                hit = backend.get(key)
+                if hit is not None:
+                    body, mimetype = hit
+                    return make_response(body, 200, {'Content-Type': mimetype})
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    backend.set(key, (response.get_data(), response.content_type))
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *names):
+        backend = self.backend
+        if backend is not None:
+            backend.delete_prefix(*(f'{name}?' for name in names))
+
+    def stats(self):
+        backend = self.backend
+        return backend.stats() if backend is not None else {}
@@ -0,0 +1,215 @@
+import zlib
+
+from flask import current_app, make_response, request
+
+from app.cache import LocalCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain',
+                          'text/html', 'text/css', 'application/javascript')
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6, 'deflate': 6}
+
+
+def _zlib(wbits):
+    def start(level):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+        return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+                compressor.flush)
+    return start
+
+
+def _brotli(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush)
+
+
+# Content codings this process can produce, most preferred first. Each starts
+# a compressor and returns its (compress, sync_flush, finish) functions.
+ENCODERS = {}
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd
+if brotli is not None:
+    ENCODERS['br'] = _brotli
+ENCODERS['gzip'] = _zlib(31)
+ENCODERS['deflate'] = _zlib(15)
+
+
+def etag_variants(etag):
+    """``etag`` plus the ETags of its compressed variants, for If-None-Match checks."""
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODERS]
+
+
+class Compression:
+    """
+    Compresses responses for clients that send a matching ``Accept-Encoding``.
+
+    zstd and brotli are used when their packages are installed, otherwise
+    gzip or deflate; COMPRESSION_ENCODINGS lists the ones to offer, in order
+    of preference, and COMPRESSION_LEVELS overrides their levels. Bodies under
+    COMPRESSION_MIN_SIZE bytes are sent as they are. Streamed responses are
+    compressed chunk by chunk and flushed after each one, so memory stays
+    flat and clients still see rows as they are produced.
+
+    Responses with an ETag (see ``conditional``) get ``-<encoding>`` appended
+    to it, and their compressed bodies are kept in an LRU of
+    COMPRESSION_CACHE_SIZE entries keyed by ETag and encoding, so a repeated
+    request for an unchanged listing skips both the view and the compressor.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESSION_ENABLED', True)
+        app.config.setdefault('COMPRESSION_ENCODINGS', tuple(DEFAULT_LEVELS))
+        app.config.setdefault('COMPRESSION_LEVELS', {})
+        app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESSION_CACHE_SIZE', 256)
+        app.config.setdefault('COMPRESSION_CACHE_TTL', 300)
+        if not app.config['COMPRESSION_ENABLED']:
+            app.extensions['compression'] = None
+            return
+        app.extensions['compression'] = _Variants(app)
+        # Registered after the other extensions, so this runs before their
+        # after_request hooks and those see the compressed size
+        app.after_request(self._after_request)
+
+    @property
+    def variants(self):
+        """The current app's compressed bodies; None if compression is off."""
+        return current_app.extensions['compression']
+
+    def negotiate(self):
+        """The content coding to answer this request with, or None."""
+        variants = self.variants
+        return variants.negotiate() if variants is not None else None
+
+    def cached_response(self, etag):
+        """A stored compressed variant of the response tagged ``etag``, or None."""
+        return cached_variant(etag)
+
+    def variant_etag(self, etag):
+        """The ETag this request's 200 carried: ``etag`` with the suffix if it was compressed."""
+        return variant_etag(etag)
+
+    def _level(self, encoding):
+        return current_app.config['COMPRESSION_LEVELS'].get(encoding, DEFAULT_LEVELS[encoding])
+
+    def _after_request(self, response):
+        if response.status_code == 304 and response.get_etag()[0]:
+            # Tagged 304s name a variant, so caches must key them like the 200s
+            response.vary.add('Accept-Encoding')
+            return response
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = response.headers.get('Content-Encoding')
+        if encoding is None:
+            encoding = self.negotiate()
+            if encoding is None:
+                return response
+            if response.is_streamed:
+                self._compress_stream(response, encoding)
+            elif not self._compress(response, encoding):
+                return response
+
+        etag, weak = response.get_etag()
+        if etag and encoding in ENCODERS and not etag.endswith(f'-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
+
+    def _compress(self, response, encoding):
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESSION_MIN_SIZE']:
+            return False
+        compress, _, finish = ENCODERS[encoding](self._level(encoding))
+        response.set_data(compress(body) + finish())
+        response.headers['Content-Encoding'] = encoding
+        etag, _ = response.get_etag()
+        if etag:
+            self.variants.store(etag, encoding, response.get_data(), response.content_type)
+        return True
+
+    def _compress_stream(self, response, encoding):
+        compress, sync_flush, finish = ENCODERS[encoding](self._level(encoding))
+        source = response.response
+        charset = response.charset
+
+        def generate():
+            try:
+                for chunk in source:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode(charset)
+                    data = compress(chunk) + sync_flush()
+                    if data:
+                        yield data
+                yield finish()
+            finally:
+                if hasattr(source, 'close'):
+                    source.close()
+
+        response.response = generate()
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+
+
+class _Variants:
+    """The compressed bodies of one app, keyed by ETag and encoding."""
+
+    def __init__(self, app):
+        self.app = app
+        self._cache = LocalCache(app.config['COMPRESSION_CACHE_SIZE'],
+                                 app.config['COMPRESSION_CACHE_TTL'])
+
+    def negotiate(self):
+        offered = [encoding for encoding in self.app.config['COMPRESSION_ENCODINGS']
+                   if encoding in ENCODERS]
+        return request.accept_encodings.best_match(offered)
+
+    def store(self, etag, encoding, body, mimetype):
+        self._cache.set(f'{etag}|{encoding}', (body, mimetype))
+
+    def cached_response(self, etag):
+        encoding = self.negotiate()
+        hit = self._cache.get(f'{etag}|{encoding}') if encoding is not None else None
+        if hit is None:
+            return None
+        body, mimetype = hit
+        return make_response(body, 200, {'Content-Type': mimetype, 'Content-Encoding': encoding,
+                                         'Vary': 'Accept-Encoding'})
+
+    def variant_etag(self, etag):
+        encoding = self.negotiate()
+        if encoding is not None and self._cache.get(f'{etag}|{encoding}') is not None:
+            return f'{etag}-{encoding}'
+        return etag
+
+
+def cached_variant(etag):
+    """``Compression.cached_response`` for the current app; None if compression is off."""
+    variants = current_app.extensions.get('compression')
+    return variants.cached_response(etag) if variants is not None else None
+
+
+def variant_etag(etag):
+    """``Compression.variant_etag`` for the current app; ``etag`` if compression is off."""
+    variants = current_app.extensions.get('compression')
+    return variants.variant_etag(etag) if variants is not None else etag
@@ -0,0 +1,68 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+from app.auth import get_user_id
+from app.compression import cached_variant, etag_variants, variant_etag
+from app.versioning import table_version
+
+ONE_SECOND = datetime.timedelta(seconds=1)
+
+
+def conditional(table, per_user=False):
+    """
+    Answer GETs with ETag / Last-Modified derived from ``table``'s change counter.
+
+    The validators are computed from one primary-key lookup before the view
+    runs, so a matching If-None-Match or If-Modified-Since yields a 304 without
+    fetching or serializing any rows. A compressed copy of the same version
+    kept by the compression extension is returned without running the view.
+    With ``per_user`` the response depends on the token's user, which then
+    goes into the ETag and ``Vary``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            counter, updated_at = table_version(table)
+            key = f"{table}:{counter}:{request.full_path}:{request.headers.get('Accept', '')}"
+            if per_user:
+                key += f':{get_user_id()}'
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            last_modified = None
+            if updated_at is not None:
+                last_modified = updated_at.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+                # HTTP dates stop at seconds: until the second of the last write
+                # has passed, another write could follow under the same date, so
+                # the date is neither sent nor trusted and only the ETag validates
+                if last_modified + ONE_SECOND > datetime.datetime.now(datetime.timezone.utc):
+                    last_modified = None
+
+            if request.if_none_match:
+                # The 304 carries the tag of the variant the client holds
+                matched = next((tag for tag in etag_variants(etag)
+                                if request.if_none_match.contains(tag)), None)
+                not_modified = matched is not None
+            else:
+                matched = None
+                not_modified = (last_modified is not None and request.if_modified_since is not None
+                                and last_modified <= request.if_modified_since)
+
+            if not_modified:
+                response = make_response('', 304)
+                etag = matched or variant_etag(etag)
+            else:
+                response = cached_variant(etag)
+                if response is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+            response.set_etag(etag)
+            if per_user:
+                response.vary.add('Authorization')
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
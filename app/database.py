@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import threading
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URI = 'sqlite:///../instance/database.sqlite'
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; busy_timeout makes writers wait instead of failing with
+# "database is locked".
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+}
+
+
+def configure_database(app):
+    """Fill in database settings from the environment; call before ``db.init_app``."""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI',
+                          os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URI))
+
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    for name in pragmas:
+        value = os.environ.get(f'SQLITE_{name.upper()}')
+        if value is not None:
+            pragmas[name] = value
+    app.config.setdefault('SQLITE_PRAGMAS', pragmas)
+
+    engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+        # One pool per worker process: size it to the worker's thread count.
+        engine_options.setdefault('pool_size', int(os.environ.get('DB_POOL_SIZE', 8)))
+        engine_options.setdefault('max_overflow', int(os.environ.get('DB_MAX_OVERFLOW', 4)))
+        engine_options.setdefault('pool_timeout', int(os.environ.get('DB_POOL_TIMEOUT', 30)))
+
+
+def install_sqlite_pragmas(app, engine):
+    """Run the configured PRAGMAs on each new connection."""
+    pragmas = app.config['SQLITE_PRAGMAS']
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def log_database_settings(app, engine):
+    """
+    Log the effective settings at INFO once per process, from the first
+    request it serves: pre-forked workers each log their own pool, and
+    building the app never connects.
+    """
+    logged = []
+    lock = threading.Lock()
+
+    @app.before_request
+    def _log_database_settings():
+        if logged:
+            return
+        with lock:
+            if logged:
+                return
+            logged.append(True)
+        with engine.connect() as connection:
+            settings = describe_connection(engine, connection.connection.dbapi_connection)
+        app.logger.info('Database settings: %s', settings)
+
+
+def dispose_engine_after_fork(engine):
+    """
+    Give every forked child process a fresh connection pool.
+
+    Connections inherited from the parent are dropped without being closed,
+    so no SQLite handle is ever used (or closed) from two processes.
+    """
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+def describe_connection(engine, dbapi_connection):
+    """Effective pool settings and PRAGMA values as seen by one connection."""
+    settings = {'url': engine.url.render_as_string(hide_password=True),
+                'pool': engine.pool.status()}
+    cursor = dbapi_connection.cursor()
+    for name in DEFAULT_SQLITE_PRAGMAS:
+        settings[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+    cursor.close()
+    return settings
@@ -0,0 +1,286 @@
+import json
+import threading
+from collections import deque
+
+from flask import current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from app.models import db
+from app.versioning import VERSIONED_MODELS, changed_rows, current_version, deleted_rows
+
+EVENT_STREAM = 'text/event-stream'
+
+# Above this many subscribed users the hub reads every change and filters in Python
+MAX_FILTERED_USERS = 500
+
+
+def format_event(name, data, version=None):
+    """One server-sent event; ``version`` becomes its ``id`` for Last-Event-ID resumes."""
+    lines = f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n'
+    if version is not None:
+        lines += f'id: {version}\n'
+    return lines + '\n'
+
+
+def render_changes(changes):
+    """
+    Format ``(version, name, data)`` changes, sorted by version, as events.
+
+    Rows written in one transaction share a version, so only the last event
+    of each version carries the ID: a client that reconnects halfway through
+    a version is sent all of it again.
+    """
+    chunks = []
+    for i, (version, name, data) in enumerate(changes):
+        last = i + 1 == len(changes) or changes[i + 1][0] != version
+        chunks.append((version, format_event(name, data, version if last else None)))
+    return chunks
+
+
+class Subscriber:
+    """One open stream: a bounded buffer of formatted events for one user."""
+
+    def __init__(self, user_id, version, max_buffered):
+        self.user_id = user_id
+        # Everything up to this version is for the catch-up, not the hub
+        self.version = version
+        self._max_buffered = max_buffered
+        self._buffer = deque()
+        self._resync = None
+        self._closed = False
+        self._ready = threading.Condition()
+
+    def push(self, chunks):
+        with self._ready:
+            if self._resync is None and len(self._buffer) + len(chunks) > self._max_buffered:
+                # A client this far behind catches up with a delta sync instead
+                self._resync = self._buffer[0][0] - 1 if self._buffer else chunks[0][0] - 1
+                self._buffer.clear()
+            if self._resync is None:
+                self._buffer.extend(chunks)
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+
+    def wait(self, timeout):
+        """Events ready within ``timeout`` seconds (``''`` if none); None once closed."""
+        with self._ready:
+            if not (self._buffer or self._resync is not None or self._closed):
+                self._ready.wait(timeout)
+            if self._closed:
+                return None
+            text = ''
+            if self._resync is not None:
+                text = format_event('resync', {'since': self._resync})
+                self._resync = None
+            text += ''.join(chunk for _, chunk in self._buffer)
+            self._buffer.clear()
+            return text
+
+
+class EventHub:
+    """
+    Fans progress, queue and subscription changes out to server-sent event streams.
+
+    One thread per process watches the sync counter, woken at once by commits
+    in this process and every EVENTS_POLL_INTERVAL_MS for the others. When it
+    moves, the hub reads the rows and tombstones written since, for subscribed
+    users only, and appends each user's events to their streams. Streams hold
+    no database connection while they wait. A stream whose buffer passes
+    EVENTS_BUFFER_SIZE gets a ``resync`` event with the version to delta-sync
+    from instead; at most EVENTS_MAX_STREAMS are open per process.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_POLL_INTERVAL_MS', 500)
+        app.config.setdefault('EVENTS_HEARTBEAT_INTERVAL', 15)
+        app.config.setdefault('EVENTS_BUFFER_SIZE', 256)
+        app.config.setdefault('EVENTS_MAX_STREAMS', 100)
+        app.extensions['event_hub'] = _Hub(app)
+
+    @staticmethod
+    def hub():
+        """The current app's hub, for code that outlives the app context (streams)."""
+        return current_app.extensions['event_hub']
+
+    @property
+    def streams(self):
+        return self.hub().streams
+
+    def subscribe(self, user_id):
+        """Register a stream for ``user_id``; None if EVENTS_MAX_STREAMS are open."""
+        return self.hub().subscribe(user_id)
+
+    def unsubscribe(self, subscriber):
+        self.hub().unsubscribe(subscriber)
+
+    def catch_up(self, subscriber, since):
+        """
+        Events a client that last saw version ``since`` missed before subscribing.
+
+        Returns formatted events, or a ``resync`` event when there are more
+        than EVENTS_BUFFER_SIZE of them.
+        """
+        return self.hub().catch_up(subscriber, since)
+
+    def close(self):
+        """End every open stream and refuse new ones, e.g. before a graceful shutdown."""
+        self.hub().close()
+
+    def shutdown(self):
+        self.hub().shutdown()
+
+    def poll(self):
+        """Deliver everything committed since the last poll; returns the events sent."""
+        return self.hub().poll()
+
+
+class _Hub:
+    """The subscribers and poll thread of one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self._subscribers = {}
+        self._count = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    @property
+    def streams(self):
+        return self._count
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._closed or self._count >= self.app.config['EVENTS_MAX_STREAMS']:
+                return None
+            if not self._subscribers:
+                # Nobody was listening, so the hub has not kept up
+                self._version = current_version()
+            subscriber = Subscriber(user_id, self._version, self.app.config['EVENTS_BUFFER_SIZE'])
+            self._subscribers.setdefault(user_id, []).append(subscriber)
+            self._count += 1
+        self._ensure_started()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def catch_up(self, subscriber, since):
+        if since >= subscriber.version:
+            return ''
+        changes = [change for _, change in
+                   self._read_changes(since, subscriber.version, {subscriber.user_id})]
+        if len(changes) > self.app.config['EVENTS_BUFFER_SIZE']:
+            return format_event('resync', {'since': since})
+        changes.sort(key=lambda change: change[0])
+        return ''.join(chunk for _, chunk in render_changes(changes))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            subscribers = [s for group in self._subscribers.values() for s in group]
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def shutdown(self):
+        self.close()
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self):
+        with self._lock:
+            since = self._version
+            users = set(self._subscribers)
+        if since is None or not users:
+            return 0
+        with self.app.app_context():
+            version = current_version()
+            if version <= since:
+                return 0
+            changes = self._read_changes(since, version, users)
+        by_user = {}
+        for user_id, change in changes:
+            if user_id in users:
+                by_user.setdefault(user_id, []).append(change)
+
+        sent = 0
+        with self._lock:
+            self._version = max(self._version, version)
+            targets = {user_id: list(self._subscribers.get(user_id, ())) for user_id in by_user}
+        for user_id, user_changes in by_user.items():
+            user_changes.sort(key=lambda change: change[0])
+            chunks = render_changes(user_changes)
+            for subscriber in targets[user_id]:
+                fresh = [chunk for chunk in chunks if chunk[0] > subscriber.version]
+                if fresh:
+                    subscriber.push(fresh)
+                    sent += len(fresh)
+        return sent
+
+    def _read_changes(self, since, version, users):
+        filtered = len(users) <= MAX_FILTERED_USERS
+        changes = []
+        for model in VERSIONED_MODELS:
+            name = model.__tablename__
+            subset = users if filtered else None
+            stmt = changed_rows(model, since, version, subset)
+            tombstones = deleted_rows(model, since, version, subset)
+            changes += [(row.user_id, (row.version, name, model.row_dict(row)))
+                        for row in db.session.execute(stmt)]
+            changes += [(user_id, (row_version, f'{name}.deleted', {'id': row_id}))
+                        for user_id, row_id, row_version in db.session.execute(tombstones)]
+        return changes
+
+    def committed(self):
+        if self._thread is not None:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = self.app.config['EVENTS_POLL_INTERVAL_MS'] / 1000
+        while not self._stopped.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.poll()
+            except Exception:
+                self.app.logger.exception('Event hub poll failed')
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_hub(session):
+    """Wake the poll thread of the committing app's hub, so its streams see the commit at once."""
+    if has_app_context():
+        hub = current_app.extensions.get('event_hub')
+        if hub is not None:
+            hub.committed()
@@ -0,0 +1,337 @@
+import datetime
+import http.client
+import ipaddress
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain, zip_longest
+from urllib.parse import urlsplit
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import db, Podcast, Subscription
+from app.versioning import bump_counters
+
+ITUNES = '{http://www.itunes.com/dtds/podcast-1.0.dtd}'
+
+FeedResult = namedtuple('FeedResult', 'url status episodes etag last_modified elapsed')
+
+
+def parse_feed(stream):
+    """
+    Parse an RSS podcast feed incrementally into episode dicts.
+
+    Item elements are cleared as soon as they are read, so large feeds are
+    never held in memory as a tree.
+    """
+    episodes = []
+    channel_author = channel_image = None
+    item = None
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'item':
+                item = {}
+            continue
+
+        tag = element.tag
+        if tag == 'item':
+            url = item.get('enclosure') or item.get('link')
+            if url:
+                episodes.append({'title': item.get('title') or url, 'url': url,
+                                 'author_name': item.get('author'),
+                                 'image_url': item.get('image')})
+            item = None
+            element.clear()
+        elif item is not None:
+            if tag == 'title':
+                item['title'] = (element.text or '').strip()
+            elif tag == 'link':
+                item['link'] = (element.text or '').strip()
+            elif tag == 'enclosure':
+                item['enclosure'] = element.get('url')
+            elif tag in (ITUNES + 'author', 'author'):
+                item['author'] = (element.text or '').strip()
+            elif tag == ITUNES + 'image':
+                item['image'] = element.get('href')
+        elif tag == ITUNES + 'author':
+            channel_author = (element.text or '').strip()
+        elif tag == ITUNES + 'image':
+            channel_image = element.get('href')
+
+    for episode in episodes:
+        episode['author_name'] = episode['author_name'] or channel_author
+        episode['image_url'] = episode['image_url'] or channel_image
+    return episodes
+
+
+class BlockedAddress(OSError):
+    """Raised instead of connecting to a feed host that is not on the public internet."""
+
+
+def is_public_address(address):
+    """False for private, loopback, link-local, multicast and reserved IPs."""
+    ip = ipaddress.ip_address(address.partition('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    ``socket.create_connection`` that refuses hosts resolving to a non-public address.
+
+    The socket connects to the very addresses that were checked, so the host
+    cannot resolve to a public address for the check and to an internal one
+    for the connection.
+    """
+    host, port = address
+    resolved = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    blocked = [ip for ip in resolved if not is_public_address(ip)]
+    if blocked:
+        raise BlockedAddress(f'{host} resolves to non-public address {blocked[0]}')
+    error = None
+    for ip in resolved:
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows at most ``max_redirects`` redirects, to http(s) URLs only."""
+
+    def __init__(self, max_redirects):
+        self.max_redirects = max_redirects
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        hops = getattr(req, 'redirects', 0)
+        if hops >= self.max_redirects:
+            raise urllib.error.HTTPError(req.full_url, code, 'Too many redirects', headers, fp)
+        if urlsplit(newurl).scheme not in ('http', 'https'):
+            raise urllib.error.HTTPError(req.full_url, code, 'Redirect to a non-HTTP URL',
+                                         headers, fp)
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None:
+            new.redirects = hops + 1
+        return new
+
+
+def feed_opener(max_redirects=5, allow_private=False):
+    """
+    A urllib opener for feed URLs, which users choose and the server fetches.
+
+    Unless ``allow_private``, every connection (the first and the one after
+    each redirect) is refused when the host resolves to an address that is
+    not public, so a feed URL cannot reach internal services or cloud
+    metadata endpoints. Environment proxies are not used: the checks apply
+    to the feed host itself.
+    """
+    handlers = [urllib.request.ProxyHandler({}), _RedirectHandler(max_redirects)]
+    if not allow_private:
+        handlers += [_PublicHTTPHandler(), _PublicHTTPSHandler()]
+    return urllib.request.build_opener(*handlers)
+
+
+def fetch_feed(url, etag=None, last_modified=None, timeout=10, max_redirects=5,
+               allow_private=False):
+    """Conditionally GET one feed; never raises, errors come back as status 'error'."""
+    started = time.monotonic()
+    if urlsplit(url).scheme not in ('http', 'https'):
+        return FeedResult(url, 'error', [], None, None, 0.0)
+
+    headers = {'User-Agent': 'podcast-sync feed refresher'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        opener = feed_opener(max_redirects, allow_private)
+        with opener.open(urllib.request.Request(url, headers=headers),
+                         timeout=timeout) as response:
+            episodes = parse_feed(response)
+            return FeedResult(url, 'ok', episodes, response.headers.get('ETag'),
+                              response.headers.get('Last-Modified'),
+                              time.monotonic() - started)
+    except urllib.error.HTTPError as e:
+        status = 'not_modified' if e.code == 304 else 'error'
+        return FeedResult(url, status, [], etag, last_modified, time.monotonic() - started)
+    except (OSError, ET.ParseError, ValueError):
+        return FeedResult(url, 'error', [], None, None, time.monotonic() - started)
+
+
+def due_feeds(now=None):
+    """Subscriptions whose feed is due a check at ``now``; every one without ``now``."""
+    stmt = db.select(Subscription.id, Subscription.url, Subscription.feed_etag,
+                     Subscription.feed_last_modified, Subscription.feed_backoff)
+    if now is not None:
+        stmt = stmt.where(db.or_(Subscription.feed_next_check_at.is_(None),
+                                 Subscription.feed_next_check_at <= now))
+    return stmt
+
+
+def _fetch_limited(limit, *args):
+    with limit:
+        return fetch_feed(*args)
+
+
+class FeedRefresher:
+    """
+    Fetches due subscription feeds on a bounded thread pool and stores new episodes.
+
+    Subscriptions sharing a URL are fetched once, and at most
+    FEED_PER_HOST_LIMIT fetches run against one host at a time; feeds are
+    queued round-robin across hosts so a host at its limit doesn't tie up
+    the pool. Feed hosts must resolve to public addresses unless
+    FEED_ALLOW_PRIVATE_ADDRESSES is set, and at most FEED_MAX_REDIRECTS
+    redirects are followed. Fetches that fail, are slow
+    or bring nothing new push the feed's next check out exponentially, up to
+    FEED_MAX_BACKOFF seconds; a feed with new episodes goes back to
+    FEED_MIN_INTERVAL.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEED_REFRESH_WORKERS', 8)
+        app.config.setdefault('FEED_REFRESH_TIMEOUT', 10)
+        app.config.setdefault('FEED_PER_HOST_LIMIT', 2)
+        app.config.setdefault('FEED_MAX_REDIRECTS', 5)
+        app.config.setdefault('FEED_ALLOW_PRIVATE_ADDRESSES', False)
+        app.config.setdefault('FEED_REFRESH_INTERVAL', None)
+        app.config.setdefault('FEED_MIN_INTERVAL', 900)
+        app.config.setdefault('FEED_MAX_BACKOFF', 86400)
+        app.config.setdefault('FEED_SLOW_SECONDS', 5)
+        app.extensions['feed_refresher'] = _Schedule(app)
+
+    def refresh(self, force=False):
+        """Refresh every due feed (every feed with ``force``); returns counters."""
+        config = current_app.config
+        due = None if force else datetime.datetime.utcnow()
+        feeds = {}
+        for row in db.session.execute(due_feeds(due)):
+            feeds.setdefault(row.url, []).append(row)
+        db.session.rollback()
+
+        stats = {'feeds': len(feeds), 'ok': 0, 'not_modified': 0, 'error': 0, 'episodes': 0}
+        by_host = {}
+        for url in feeds:
+            by_host.setdefault(urlsplit(url).netloc, []).append(url)
+        limits = {host: threading.BoundedSemaphore(config['FEED_PER_HOST_LIMIT'])
+                  for host in by_host}
+        with ThreadPoolExecutor(max_workers=config['FEED_REFRESH_WORKERS']) as pool:
+            futures = []
+            for url in filter(None, chain.from_iterable(zip_longest(*by_host.values()))):
+                # Only send validators every subscriber agrees on, or a newly
+                # added subscription would never receive the existing episodes.
+                validators = {(s.feed_etag, s.feed_last_modified) for s in feeds[url]}
+                etag, last_modified = validators.pop() if len(validators) == 1 else (None, None)
+                futures.append(pool.submit(_fetch_limited, limits[urlsplit(url).netloc], url,
+                                           etag, last_modified, config['FEED_REFRESH_TIMEOUT'],
+                                           config['FEED_MAX_REDIRECTS'],
+                                           config['FEED_ALLOW_PRIVATE_ADDRESSES']))
+            for future in as_completed(futures):
+                result = future.result()
+                stats[result.status] += 1
+                stats['episodes'] += self._store(result, feeds[result.url])
+
+        if stats['episodes']:
+            cache = current_app.extensions.get('response_cache')
+            if cache is not None:
+                cache.delete_prefix('podcasts?')
+        return stats
+
+    def _store(self, result, subscriptions):
+        """Insert new episodes and reschedule the feed, in one short transaction."""
+        config = current_app.config
+        inserted = 0
+        if result.episodes:
+            stmt = sqlite_insert(Podcast).on_conflict_do_nothing(
+                index_elements=[Podcast.subscription_id, Podcast.url])
+            rows = [dict(episode, subscription_id=s.id)
+                    for s in subscriptions for episode in result.episodes]
+            inserted = db.session.connection().execute(stmt, rows).rowcount
+            if inserted:
+                bump_counters(db.session, ['podcast'])
+
+        productive = inserted > 0 and result.elapsed < config['FEED_SLOW_SECONDS']
+        for s in subscriptions:
+            backoff = 0 if productive else min(s.feed_backoff + 1, 16)
+            delay = min(config['FEED_MIN_INTERVAL'] * 2 ** backoff, config['FEED_MAX_BACKOFF'])
+            if result.status == 'error':
+                etag, last_modified = s.feed_etag, s.feed_last_modified
+            else:
+                etag, last_modified = result.etag, result.last_modified
+            db.session.execute(
+                db.update(Subscription).where(Subscription.id == s.id).values(
+                    feed_etag=etag, feed_last_modified=last_modified, feed_backoff=backoff,
+                    feed_next_check_at=datetime.datetime.utcnow()
+                    + datetime.timedelta(seconds=delay)))
+        db.session.commit()
+        return inserted
+
+    def start(self):
+        """Refresh in a background thread every FEED_REFRESH_INTERVAL seconds."""
+        schedule = current_app.extensions['feed_refresher']
+        if schedule.thread is not None or not schedule.app.config['FEED_REFRESH_INTERVAL']:
+            return
+        schedule.stopped.clear()
+        schedule.thread = threading.Thread(target=self._run, args=(schedule,),
+                                           name='feed-refresher', daemon=True)
+        schedule.thread.start()
+
+    def stop(self):
+        schedule = current_app.extensions['feed_refresher']
+        schedule.stopped.set()
+        if schedule.thread is not None:
+            schedule.thread.join()
+            schedule.thread = None
+
+    def _run(self, schedule):
+        app = schedule.app
+        while not schedule.stopped.wait(app.config['FEED_REFRESH_INTERVAL']):
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Feed refresh failed')
+
+
+class _Schedule:
+    """The background refresh thread of one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.thread = None
+        self.stopped = threading.Event()
@@ -1,38 +1,69 @@
-from flask import Flask, request, jsonify
+import datetime
+import os
+from xml.etree.ElementTree import ParseError
+
+import click
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 
-from flasgger import Swagger, Schema#, fields
+from flasgger import Schema#, fields
 from flasgger.utils import swag_from
 
 from flask_marshmallow import Marshmallow, fields
 from marshmallow import fields
 from http import HTTPStatus
+from sqlalchemy.exc import IntegrityError
 
 from app.models import User, Progress, Podcast, Queue, Subscription
 from app.models import db
+from app.apispec import PrebuiltSwagger
+from app.auth import (Auth, HashingBusy, authenticated, authorized, get_user_id, may_act_for,
+                      query_token)
+from app.cache import ResponseCache, serve_shared_cache, shared_cache_settings
+from app.compression import Compression
+from app.conditional import conditional
+from app.database import (configure_database, describe_connection, dispose_engine_after_fork,
+                          install_sqlite_pragmas, log_database_settings)
+from app.events import EVENT_STREAM, EventHub, format_event
+from app.feeds import FeedRefresher
+from app.metrics import Metrics
+from app.ndjson import ndjson_response, wants_ndjson
+from app.opml import iter_feeds
+from app.ordering import key_between
+from app.pagination import cursor_requested, keyset_page, page_args
+from app.profiler import SQLProfiler
+from app import queries
+from app.progress_buffer import ProgressBuffer
+from app.query_plans import check_query_plans
+from app.search import search
+from app.seed import seed
+from app.versioning import changes_since, next_version
 
 # https://www.programcreek.com/python/?code=flasgger%2Fflasgger%2Fflasgger-master%2Fexamples%2Fbasic_auth.py#
 
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../instance/database.sqlite'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-
-app.config['SWAGGER'] = {
-        "swagger_version": "2.0",
-        "title": "Podcast Sync - REST API",
-        "description": "",
-        }
-
+# Extensions are created unbound and attached to an app by create_app(). Each
+# keeps its per-app state in app.extensions[<name>], set up by init_app(), and
+# its methods act on the current app's, so one module-level instance serves
+# every app (tests build many).
+ma = Marshmallow()
+metrics = Metrics()
+sql_profiler = SQLProfiler()
+progress_buffer = ProgressBuffer()
+response_cache = ResponseCache()
+feed_refresher = FeedRefresher()
+event_hub = EventHub()
+auth = Auth()
+compression = Compression()
+swagger = PrebuiltSwagger()
 
+# Every route and CLI command lives on this blueprint; CLI commands stay top-level
+api = Blueprint('api', __name__, cli_group=None)
 
-db.init_app(app)
 
-ma = Marshmallow(app)
-
-
-swagger = Swagger(app)
+def is_integer(value):
+    """True for a JSON integer; ``true``/``false`` decode to bool, which is an int too."""
+    return isinstance(value, int) and not isinstance(value, bool)
 
 # class UserSchema(ma.Schema):
 #     __model__ = User
@@ -68,29 +99,52 @@ class UserSchema(Schema):
 
 
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@authenticated
 # @swag_from({'responses': { HTTPStatus.OK.value: { 'schema': UserSchema } } })
 # @swag_from({'definitions': {UserSchema} })
+@conditional('user', per_user=True)
 def get_users():
     """
-    Get all users
+    Get all users, or only the token's user
     ---
     tags:
       - User
-    responses:
+    parameters:
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - return only rows with an ID greater than this one
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - page size, capped at MAX_PAGE_SIZE
     responses:
       200:
-        description: A single user item
+        description: >
+          All users (just the token's user when a token is sent), or
+          {items, next} when after/limit are given
         schema:
           $ref: '#/definitions/user1'
     """
-    users = User.query.all()
+    stmt = User.projection()
+    token_user = get_user_id()
+    if token_user is not None:
+        stmt = stmt.where(User.id == token_user)
+
+    if cursor_requested():
+        users, next_cursor = keyset_page(stmt, User.id)
+        return jsonify({'items': [User.row_dict(user) for user in users], 'next': next_cursor})
+
+    users = db.session.execute(stmt)
     result = []
     for user in users:
-        result.append({'id': user.id, 'name': user.name, 'email': user.email})
+        result.append(User.row_dict(user))
     return jsonify(result)
 
-@app.route('/users', methods=['POST'])
+@api.route('/users', methods=['POST'])
 def create_user():
     """
     Create a new user
@@ -109,18 +163,33 @@ def create_user():
             email:
               type: string
               description: The user's email address
+            password:
+              type: string
+              description: The user's password, stored as a salted hash
     responses:
       200:
         description: User created successfully
+      400:
+        description: Missing required fields
+      503:
+        description: Too many passwords being hashed; retry later
     """
-    name = request.json['name']
-    email = request.json['email']
-    user = User(name=name, email=email)
+    data = request.get_json(silent=True) or {}
+    name, email, password = data.get('name'), data.get('email'), data.get('password')
+    if not name or not email or not password:
+        return jsonify({'message': 'Please provide all required fields.'}), 400
+    try:
+        password_hash, salt = auth.hash_password(password)
+    except HashingBusy:
+        return jsonify({'message': 'Server busy, try again'}), 503, {'Retry-After': '1'}
+    user = User(name=name, email=email, password=password_hash, salt=salt)
     db.session.add(user)
     db.session.commit()
-    return jsonify({'message': 'User created successfully'})
+    return jsonify({'message': 'User created successfully', 'id': user.id})
 
-@app.route('/users/<int:user_id>', methods=['GET'])
+@api.route('/users/<int:user_id>', methods=['GET'])
+@authorized
+@conditional('user')
 def get_user(user_id):
     """
     Get user by ID
@@ -154,13 +223,13 @@ def get_user(user_id):
               description: The email address of the user
               example: john.doe@example.com
     """
-    user = User.query.get(user_id)
+    user = db.session.execute(User.projection().where(User.id == user_id)).first()
     if user is None:
         return jsonify({'message': 'User not found'}), 404
-    user_data = {'id': user.id, 'name': user.name, 'email': user.email}
-    return jsonify(user_data)
+    return jsonify(User.row_dict(user))
 
-@app.route('/users/<int:user_id>', methods=['PUT'])
+@api.route('/users/<int:user_id>', methods=['PUT'])
+@authorized
 def update_user(user_id):
     """
     Update user by ID
@@ -216,7 +285,8 @@ def update_user(user_id):
     return jsonify(user_data)
 
 
-@app.route('/users/<int:user_id>', methods=['DELETE'])
+@api.route('/users/<int:user_id>', methods=['DELETE'])
+@authorized
 def delete_user(user_id):
     """
     Delete user by ID
@@ -241,17 +311,97 @@ def delete_user(user_id):
     return jsonify({'message': 'User deleted'})
 
 
-
-@app.route('/progress', methods=['GET'])
+@api.route('/login', methods=['POST'])
+def login():
+    """
+    Exchange an email and password for a bearer token
+    ---
+    tags:
+      - User
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          properties:
+            email:
+              type: string
+            password:
+              type: string
+    responses:
+      200:
+        description: >
+          {token, user_id, expires_in}; send the token as
+          `Authorization: Bearer <token>` (or `?access_token=` for event streams)
+      400:
+        description: Missing email or password
+      401:
+        description: Wrong email or password
+      503:
+        description: Too many passwords being hashed; retry later
+    """
+    data = request.get_json(silent=True) or request.form
+    email, password = data.get('email'), data.get('password')
+    if not email or not password:
+        return jsonify({'message': 'Please provide all required fields.'}), 400
+    user = db.session.execute(queries.login_user(email)).first()
+    # Release the connection while the hash runs
+    db.session.close()
+    try:
+        if user is None:
+            # Hash anyway, so response times do not reveal which emails exist
+            auth.hash_password(password)
+            valid = False
+        else:
+            valid = auth.check_password(password, user.password, user.salt)
+    except HashingBusy:
+        return jsonify({'message': 'Server busy, try again'}), 503, {'Retry-After': '1'}
+    if not valid:
+        return jsonify({'message': 'Invalid email or password'}), 401
+    return jsonify({'token': auth.issue_token(user.id), 'user_id': user.id,
+                    'expires_in': current_app.config['AUTH_TOKEN_MAX_AGE']})
+
+
+
+@api.route('/progress', methods=['GET'])
+@authenticated
+@conditional('progress', per_user=True)
 def get_all_progress():
     """
     Get all progress
     ---
     tags:
       - Progress
+    produces:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - return only rows with an ID greater than this one
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - page size, capped at MAX_PAGE_SIZE
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Delta mode - only rows changed after this version, plus deleted IDs
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only this user's rows; defaults to the token's user
     responses:
       200:
-        description: All progress
+        description: >
+          All progress, {items, next} when after/limit are given, or
+          {items, deleted, version} when since is given. With
+          Accept: application/x-ndjson all rows are streamed one per line.
         schema:
           type: array
           items:
@@ -284,16 +434,34 @@ def get_all_progress():
                 minimum: 0
                 maximum: 100
     """
-    progress = Progress.query.all()
+    user_id = request.args.get('user_id', get_user_id(), type=int)
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if 'since' in request.args:
+        since = request.args.get('since', 0, type=int)
+        progress, deleted, version = changes_since(Progress, since, user_id)
+        return jsonify({'items': [Progress.row_dict(prog) for prog in progress],
+                        'deleted': deleted, 'version': version})
+
+    if cursor_requested():
+        progress, next_cursor = keyset_page(queries.owned(Progress, user_id), Progress.id)
+        return jsonify({'items': [Progress.row_dict(prog) for prog in progress],
+                        'next': next_cursor})
+
+    if wants_ndjson():
+        return ndjson_response(Progress, queries.owned(Progress, user_id))
+
+    progress = db.session.execute(queries.owned(Progress, user_id))
     progress_data = []
     for prog in progress:
-        prog_data = {'id': prog.id, 'user_id': prog.user_id,
-                     'podcast_id': prog.podcast_id, 'progress': prog.progress}
-        progress_data.append(prog_data)
+        progress_data.append(Progress.row_dict(prog))
     return jsonify(progress_data)
 
 
-@app.route('/progress/<int:progress_id>', methods=['GET'])
+@api.route('/progress/<int:progress_id>', methods=['GET'])
+@authenticated
+@conditional('progress', per_user=True)
 def get_progress(progress_id):
     """
     Get progress by ID
@@ -339,14 +507,15 @@ def get_progress(progress_id):
               minimum: 0
               maximum: 100
     """
-    prog = Progress.query.get(progress_id)
+    prog = db.session.execute(Progress.projection().where(Progress.id == progress_id)).first()
     if prog is None:
         return jsonify({'message': 'Progress not found'}), 404
-    prog_data = {'id': prog.id, 'user_id': prog.user_id,
-                 'podcast_id': prog.podcast_id, 'progress': prog.progress}
-    return jsonify(prog_data)
+    if not may_act_for(prog.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(Progress.row_dict(prog))
 
-@app.route('/progress/<int:user_id>/<int:podcast_id>', methods=['GET'])
+@api.route('/progress/<int:user_id>/<int:podcast_id>', methods=['GET'])
+@authorized
 def get_progress_by_user_and_podcast(user_id, podcast_id):
     """
     Get progress for a specific podcast and user
@@ -372,18 +541,24 @@ def get_progress_by_user_and_podcast(user_id, podcast_id):
       404:
         description: The progress was not found
     """
+    buffered = progress_buffer.get(user_id, podcast_id)
+    progress = db.session.execute(queries.user_progress(user_id, podcast_id)).first()
+    if progress is None and buffered is None:
+        return jsonify({'message': 'Progress not found'}), 404
 
-    user_id = get_user_id()
-    progress = Progress.query.filter_by(user_id=user_id, podcast_id=podcast_id).first()
-    if progress:
-        return jsonify(progress.serialize()), 200
+    if progress is not None:
+        prog_data = Progress.row_dict(progress)
     else:
-        abort(404)
+        prog_data = {'id': None, 'user_id': user_id, 'podcast_id': podcast_id}
+    if buffered is not None:
+        prog_data['progress'] = buffered
+    return jsonify(prog_data), 200
 
 
 
 
-@app.route('/progress', methods=['POST'])
+@api.route('/progress', methods=['POST'])
+@authenticated
 def create_progress():
     """
     Create new progress
@@ -393,8 +568,8 @@ def create_progress():
     parameters:
       - name: user_id
         in: formData
-        description: The ID of the user who made the progress
-        required: true
+        description: The ID of the user who made the progress; defaults to the token's user
+        required: false
         type: integer
       - name: podcast_id
         in: formData
@@ -438,13 +613,23 @@ def create_progress():
               example: 30
               minimum: 0
               maximum: 100
+      202:
+        description: Progress buffered for a later bulk write (PROGRESS_WRITE_BEHIND)
+      400:
+        description: Missing required fields
+      404:
+        description: User or podcast not found
+      409:
+        description: Progress for this user and podcast already exists
     """
-    user_id = request.form.get('user_id')
-    podcast_id = request.form.get('podcast_id')
-    progress = request.form.get('progress')
+    user_id = request.form.get('user_id', get_user_id(), type=int)
+    podcast_id = request.form.get('podcast_id', type=int)
+    progress = request.form.get('progress', type=int)
 
-    if not user_id or not podcast_id or not progress:
+    if user_id is None or podcast_id is None or progress is None:
         return jsonify({'message': 'Please provide all required fields.'}), 400
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
 
     # Check if user and podcast exist
     user = User.query.get(user_id)
@@ -454,10 +639,19 @@ def create_progress():
     if podcast is None:
         return jsonify({'message': 'Podcast not found'}), 404
 
+    if progress_buffer.enabled:
+        progress_buffer.put(user_id, podcast_id, progress)
+        return jsonify({'id': None, 'user_id': user_id,
+                        'podcast_id': podcast_id, 'progress': progress}), 202
+
     # Create new progress
     new_progress = Progress(user_id=user_id, podcast_id=podcast_id, progress=progress)
     db.session.add(new_progress)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Progress already exists, use PUT to update it'}), 409
 
     prog_data = {'id': new_progress.id, 'user_id': new_progress.user_id,
                  'podcast_id': new_progress.podcast_id, 'progress': new_progress.progress}
@@ -465,30 +659,119 @@ def create_progress():
 
 
 
-@app.route('/progress/<int:user_id>/<int:podcast_id>', methods=['PUT'])
-def update_progress(progress_id):
+@api.route('/progress/batch', methods=['POST'])
+@authenticated
+def sync_progress_batch():
     """
-    Update progress by ID
+    Apply many progress updates for one user in a single transaction
     ---
     tags:
       - Progress
     parameters:
-      - name: progress_id
-        in: path
-        description: The ID of the progress to update
+      - name: body
+        in: body
         required: true
-        type: integer
+        schema:
+          properties:
+            user_id:
+              type: integer
+              description: The ID of the user who made the progress; defaults to the token's user
+              example: 1
+            items:
+              type: array
+              items:
+                properties:
+                  podcast_id:
+                    type: integer
+                    description: The ID of the podcast for which progress was made
+                    example: 1
+                  progress:
+                    type: integer
+                    description: The progress made in the podcast
+                    example: 30
+    responses:
+      200:
+        description: >
+          Per-item status, in request order. Status is one of ok, invalid or
+          podcast_not_found. When a podcast appears more than once the last
+          entry wins.
+      400:
+        description: Malformed body or too many items
+      404:
+        description: User not found
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    user_id = data.get('user_id', get_user_id())
+    items = data.get('items')
+    if not is_integer(user_id) or not isinstance(items, list):
+        return jsonify({'message': 'Please provide user_id and a list of items.'}), 400
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    if len(items) > current_app.config['MAX_BATCH_SIZE']:
+        return jsonify({'message': f"At most {current_app.config['MAX_BATCH_SIZE']} items per batch."}), 400
+
+    if db.session.get(User, user_id) is None:
+        return jsonify({'message': 'User not found'}), 404
+
+    statuses = []
+    for item in items:
+        valid = (isinstance(item, dict) and is_integer(item.get('podcast_id'))
+                 and is_integer(item.get('progress')))
+        statuses.append({'podcast_id': item.get('podcast_id') if isinstance(item, dict) else None,
+                         'status': 'ok' if valid else 'invalid'})
+
+    requested = {item['podcast_id'] for item, st in zip(items, statuses) if st['status'] == 'ok'}
+    existing = set()
+    if requested:
+        existing = set(db.session.scalars(
+            db.select(Podcast.id).where(Podcast.id.in_(requested))))
+
+    rows = {}
+    for item, st in zip(items, statuses):
+        if st['status'] != 'ok':
+            continue
+        if item['podcast_id'] not in existing:
+            st['status'] = 'podcast_not_found'
+            continue
+        rows[item['podcast_id']] = {'user_id': user_id, 'podcast_id': item['podcast_id'],
+                                    'progress': item['progress']}
+
+    if rows:
+        with progress_buffer.discarding([(user_id, podcast_id) for podcast_id in rows]):
+            version = next_version(db.session, 'progress')
+            for row in rows.values():
+                row['version'] = version
+            db.session.execute(Progress.upsert(), list(rows.values()))
+            db.session.commit()
+
+    return jsonify({'items': statuses}), 200
+
+
+@api.route('/progress/<int:user_id>/<int:podcast_id>', methods=['PUT'])
+@authorized
+def update_progress(user_id, podcast_id):
+    """
+    Create or update progress for a specific podcast and user
+    ---
+    tags:
+      - Progress
+    parameters:
       - name: user_id
-        in: formData
+        in: path
         description: The ID of the user who made the progress
+        required: true
         type: integer
       - name: podcast_id
-        in: formData
+        in: path
         description: The ID of the podcast for which progress was made
+        required: true
         type: integer
       - name: progress
         in: formData
         description: The progress made in the podcast
+        required: true
         type: integer
     responses:
       200:
@@ -520,38 +803,47 @@ def update_progress(progress_id):
               example: 30
               minimum: 0
               maximum: 100
+      202:
+        description: Progress buffered for a later bulk write (PROGRESS_WRITE_BEHIND)
+      400:
+        description: Missing or invalid progress value
       404:
-        description: Progress not found
+        description: User or podcast not found
     """
-
-
-    progress = Progress.query.filter_by(user_id=user_id, podcast_id=podcast_id).first()
-    if progress is None:
-        return jsonify({'message': 'Progress not found.'}), 404
-
-    time = request.json.get('time', progress.time)
-    progress.time = time
+    data = request.get_json(silent=True) or request.form
+    try:
+        if isinstance(data['progress'], bool):
+            raise TypeError
+        progress = int(data['progress'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'Please provide an integer progress value.'}), 400
+
+    # SQLite does not enforce the foreign keys, so an upsert (or a buffered
+    # write) for an unknown user or podcast would leave an orphan row
+    exists = db.session.execute(db.select(
+        db.select(User.id).where(User.id == user_id).exists(),
+        db.select(Podcast.id).where(Podcast.id == podcast_id).exists())).one()
+    if not all(exists):
+        return jsonify({'message': 'User or podcast not found'}), 404
+
+    if progress_buffer.enabled:
+        progress_buffer.put(user_id, podcast_id, progress)
+        return jsonify({'id': None, 'user_id': user_id,
+                        'podcast_id': podcast_id, 'progress': progress}), 202
+
+    # A single INSERT ... ON CONFLICT DO UPDATE, backed by the unique
+    # (user_id, podcast_id) index, instead of a lookup followed by a write.
+    stmt = Progress.upsert().returning(Progress.id, Progress.user_id, Progress.podcast_id,
+                                       Progress.progress, Progress.version)
+    row = db.session.execute(stmt, {'user_id': user_id, 'podcast_id': podcast_id,
+                                    'progress': progress,
+                                    'version': next_version(db.session, 'progress')}).one()
     db.session.commit()
-
-    # # Check if user and podcast exist
-    # user = User.query.get(user_id)
-    # if user is None:
-    #     return jsonify({'message': 'User not found'}), 404
-    # podcast = Podcast.query.get(podcast_id)
-    # if podcast is None:
-    #     return jsonify({'message': 'Podcast not found'}), 404
-    #
-    # progress.user_id = user_id
-    # progress.podcast_id = podcast_id
-    # progress.progress = progress_val
-    # db.session.commit()
-
-    prog_data = {'id': progress.id, 'user_id': progress.user_id,
-                 'podcast_id': progress.podcast_id, 'progress': progress.progress}
-    return jsonify(prog_data), 200
+    return jsonify(row._asdict()), 200
 
 
-@app.route('/progress/<int:progress_id>', methods=['DELETE'])
+@api.route('/progress/<int:progress_id>', methods=['DELETE'])
+@authenticated
 def delete_progress(progress_id):
     """
     Delete progress by ID
@@ -573,25 +865,48 @@ def delete_progress(progress_id):
     progress = Progress.query.get(progress_id)
     if progress is None:
         return jsonify({'message': 'Progress not found'}), 404
+    if not may_act_for(progress.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
 
-    db.session.delete(progress)
-    db.session.commit()
+    with progress_buffer.discarding([(progress.user_id, progress.podcast_id)]):
+        db.session.delete(progress)
+        db.session.commit()
 
     return '', 204
 
 
 
 
-@app.route('/podcasts', methods=['GET'])
+@api.route('/podcasts', methods=['GET'])
+@authenticated
+@conditional('podcast', per_user=True)
+@response_cache.cached('podcasts', 'podcast', per_user=True)
 def get_podcasts():
     """
     Get all podcasts
     ---
     tags:
       - podcasts
+    parameters:
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - return only rows with an ID greater than this one
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - page size, capped at MAX_PAGE_SIZE
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only the podcasts of this user's subscriptions; defaults to the token's user
     responses:
       200:
-        description: A list of all podcasts
+        description: >
+          A list of all podcasts, or {items, next} when after/limit are given
         schema:
           type: array
           items:
@@ -603,35 +918,45 @@ def get_podcasts():
                 readOnly: true
                 format: int64
                 minimum: 1
-              name:
+              title:
                 type: string
-                description: The podcast name
+                description: The podcast title
                 example: 'My Podcast'
-              author_id:
+              author_name:
+                type: string
+                description: The name of the author of the podcast
+                example: 'Jane Doe'
+              image_url:
+                type: string
+                description: The podcast cover image
+              subscription_id:
                 type: integer
-                description: The ID of the author of the podcast
+                description: The ID of the subscription the podcast belongs to
                 example: 1
                 format: int64
                 minimum: 1
-              description:
-                type: string
-                description: The podcast description
-                example: 'A podcast about technology'
-              created_at:
+              url:
                 type: string
-                description: The timestamp when the podcast was created
-                example: '2022-03-01T10:30:00Z'
-                format: date-time
-    """
-    podcasts = Podcast.query.all()
-    podcasts_data = [{'id': podcast.id, 'name': podcast.name,
-                      'author_id': podcast.author_id, 'description': podcast.description,
-                      'created_at': podcast.created_at.isoformat()}
-                     for podcast in podcasts]
+                description: The podcast audio URL
+    """
+    user_id = request.args.get('user_id', get_user_id(), type=int)
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if cursor_requested():
+        podcasts, next_cursor = keyset_page(queries.owned_podcasts(user_id), Podcast.id)
+        return jsonify({'items': [Podcast.row_dict(podcast) for podcast in podcasts],
+                        'next': next_cursor}), 200
+
+    podcasts = db.session.execute(queries.owned_podcasts(user_id))
+    podcasts_data = [Podcast.row_dict(podcast) for podcast in podcasts]
     return jsonify(podcasts_data), 200
 
 
-@app.route('/podcasts/<int:podcast_id>', methods=['GET'])
+@api.route('/podcasts/<int:podcast_id>', methods=['GET'])
+@authenticated
+@conditional('podcast', per_user=True)
+@response_cache.cached('podcast:{podcast_id}', 'podcast', per_user=True)
 def get_podcast(podcast_id):
     """
     Get podcast by ID
@@ -656,40 +981,42 @@ def get_podcast(podcast_id):
               readOnly: true
               format: int64
               minimum: 1
-            name:
+            title:
               type: string
-              description: The podcast name
+              description: The podcast title
               example: 'My Podcast'
-            author_id:
+            author_name:
+              type: string
+              description: The name of the author of the podcast
+              example: 'Jane Doe'
+            image_url:
+              type: string
+              description: The podcast cover image
+            subscription_id:
               type: integer
-              description: The ID of the author of the podcast
+              description: The ID of the subscription the podcast belongs to
               example: 1
               format: int64
               minimum: 1
-            description:
+            url:
               type: string
-              description: The podcast description
-              example: 'A podcast about technology'
-            created_at:
-              type: string
-              description: The timestamp when the podcast was created
-              example: '2022-03-01T10:30:00Z'
-              format: date-time
+              description: The podcast audio URL
       404:
         description: Podcast not found
     """
-    podcast = Podcast.query.get(podcast_id)
-    if podcast is None:
+    owner = db.session.execute(queries.podcast_owner(podcast_id)).scalar()
+    if owner is None:
         return jsonify({'message': 'Podcast not found'}), 404
+    if not may_act_for(owner):
+        return jsonify({'message': 'Forbidden'}), 403
 
-    podcast_data = {'id': podcast.id, 'name': podcast.name,
-                     'description': podcast.description,
-                    'created_at': podcast.created_at.isoformat()}
-    return jsonify(podcast_data), 200
+    podcast = db.session.execute(Podcast.projection().where(Podcast.id == podcast_id)).first()
+    return jsonify(Podcast.row_dict(podcast)), 200
 
 
 
-@app.route('/podcasts', methods=['POST'])
+@api.route('/podcasts', methods=['POST'])
+@authenticated
 def create_podcast():
     """
     Create a new podcast
@@ -753,13 +1080,15 @@ def create_podcast():
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error creating podcast: {str(e)}'}), 500
+    response_cache.invalidate('podcasts')
 
     podcast_data = {'id': podcast.id, 'name': podcast.name,
                     'author_id': podcast.author_id, 'description': podcast.description,
                     'created_at': podcast.created_at.isoformat()}
     return jsonify(podcast_data), 201
 
-@app.route('/podcasts/<int:podcast_id>', methods=['PUT'])
+@api.route('/podcasts/<int:podcast_id>', methods=['PUT'])
+@authenticated
 def update_podcast(podcast_id):
     """
     Update a specific podcast
@@ -772,16 +1101,16 @@ def update_podcast(podcast_id):
         type: integer
         required: true
         description: The ID of the podcast to update
-      - name: name
+      - name: title
         in: query
         type: string
-        required: true
-        description: The new name of the podcast
-      - name: author_id
+        required: false
+        description: The new title of the podcast
+      - name: author_name
         in: query
-        type: integer
-        required: true
-        description: The ID of the author of the podcast
+        type: string
+        required: false
+        description: The name of the author of the podcast
     responses:
       200:
         description: The updated podcast
@@ -791,40 +1120,41 @@ def update_podcast(podcast_id):
             id:
               type: integer
               description: The ID of the podcast
-            name:
+            title:
               type: string
-              description: The name of the podcast
-            xd:
-              type: integer
-              description: The ID of the author of the podcast
+              description: The title of the podcast
+            author_name:
+              type: string
+              description: The name of the author of the podcast
       404:
         description: Podcast not found
     """
     podcast = Podcast.query.get(podcast_id)
     if not podcast:
         return jsonify({'error': 'Podcast not found'}), 404
+    if not may_act_for(db.session.execute(queries.podcast_owner(podcast_id)).scalar()):
+        return jsonify({'message': 'Forbidden'}), 403
 
-    name = request.args.get('name')
-    author_id = request.args.get('author_id')
+    title = request.args.get('title')
+    author_name = request.args.get('author_name')
 
-    if not name and not author_id:
+    if not title and not author_name:
         return jsonify({'error': 'At least one parameter must be provided'}), 400
 
-    if name:
-        podcast.name = name
+    if title:
+        podcast.title = title
 
-    if author_id:
-        author = Author.query.get(author_id)
-        if not author:
-            return jsonify({'error': 'Author not found'}), 404
-        podcast.author_id = author_id
+    if author_name:
+        podcast.author_name = author_name
 
     db.session.commit()
+    response_cache.invalidate(f'podcast:{podcast_id}', 'podcasts')
 
-    return jsonify({'id': podcast.id, 'name': podcast.name, 'author_id': podcast.author_id})
+    return jsonify(podcast.to_dict())
 
 
-@app.route('/podcasts/<int:podcast_id>', methods=['DELETE'])
+@api.route('/podcasts/<int:podcast_id>', methods=['DELETE'])
+@authenticated
 def delete_podcast(podcast_id):
     """
     Delete a specific podcast
@@ -846,9 +1176,12 @@ def delete_podcast(podcast_id):
     podcast = Podcast.query.get(podcast_id)
     if not podcast:
         return jsonify({'error': 'Podcast not found'}), 404
+    if not may_act_for(db.session.execute(queries.podcast_owner(podcast_id)).scalar()):
+        return jsonify({'message': 'Forbidden'}), 403
 
     db.session.delete(podcast)
     db.session.commit()
+    response_cache.invalidate(f'podcast:{podcast_id}', 'podcasts')
 
     return jsonify({'message': 'Podcast deleted successfully'})
 
@@ -856,23 +1189,62 @@ def delete_podcast(podcast_id):
 
 
 
-@app.route('/queue', methods=['GET'])
+@api.route('/queue', methods=['GET'])
+@authenticated
+@conditional('queue', per_user=True)
 def get_queue():
     """
     Retrieve all podcasts in the queue
     ---
     tags:
       - Queue
+    parameters:
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - return only rows with an ID greater than this one
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - page size, capped at MAX_PAGE_SIZE
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Delta mode - only rows changed after this version, plus deleted IDs
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only this user's rows; defaults to the token's user
     responses:
       200:
-        description: A list of podcasts in the queue
+        description: >
+          A list of podcasts in the queue, {items, next} when after/limit are
+          given, or {items, deleted, version} when since is given
         schema:
           type: array
           items:
             $ref: '#/definitions/Queue'
     """
-    queue = Queue.query.all()
-    result = queues_schema.dump(queue)
+    user_id = request.args.get('user_id', get_user_id(), type=int)
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if 'since' in request.args:
+        since = request.args.get('since', 0, type=int)
+        queue, deleted, version = changes_since(Queue, since, user_id)
+        return jsonify({'items': [Queue.row_dict(item) for item in queue],
+                        'deleted': deleted, 'version': version})
+
+    if cursor_requested():
+        queue, next_cursor = keyset_page(queries.owned(Queue, user_id), Queue.id)
+        return jsonify({'items': [Queue.row_dict(item) for item in queue], 'next': next_cursor})
+
+    queue = db.session.execute(queries.owned(Queue, user_id))
+    result = [Queue.row_dict(item) for item in queue]
     return jsonify(result)
 
 
@@ -881,10 +1253,267 @@ def get_queue():
 
 
 
-@app.route('/queue', methods=['POST'])
+def _queue_neighbours(data):
+    """
+    ``(after_id, before_id)`` from a queue request body, or None unless they
+    are integers and at most one of them is given.
+    """
+    after_id, before_id = data.get('after_id'), data.get('before_id')
+    if after_id is not None and before_id is not None:
+        return None
+    if not all(value is None or is_integer(value) for value in (after_id, before_id)):
+        return None
+    return after_id, before_id
+
+
+def _queue_slot(user_id, after_id=None, before_id=None):
+    """
+    Order key for a slot in a user's queue: right after ``after_id``, right
+    before ``before_id``, or at the end. Reads at most two index entries.
+    Returns None when the neighbour is not in the user's queue.
+    """
+    if after_id is not None:
+        low = db.session.scalar(queries.queue_position(user_id, after_id))
+        if low is None:
+            return None
+        high = db.session.scalar(queries.queue_neighbour(user_id, after=low))
+    elif before_id is not None:
+        high = db.session.scalar(queries.queue_position(user_id, before_id))
+        if high is None:
+            return None
+        low = db.session.scalar(queries.queue_neighbour(user_id, before=high))
+    else:
+        low = db.session.scalar(queries.queue_neighbour(user_id))
+        high = None
+    return key_between(low, high)
+
+
+@api.route('/users/<int:user_id>/queue', methods=['GET'])
+@authorized
+def get_user_queue(user_id):
+    """
+    Get a user's queue in play order
+    ---
+    tags:
+      - Queue
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose queue is requested
+    responses:
+      200:
+        description: The user's queue entries, first to play first
+        schema:
+          type: array
+          items:
+            id: Queue
+            properties:
+              id:
+                type: integer
+                description: The ID of the queue entry
+              user_id:
+                type: integer
+                description: The ID of the user owning the queue
+              podcast_id:
+                type: integer
+                description: The ID of the queued podcast
+              position:
+                type: string
+                description: Opaque order key, entries sort by it
+              version:
+                type: integer
+                description: Change version of the entry
+    """
+    queue = db.session.execute(queries.user_queue(user_id))
+    return jsonify([Queue.row_dict(item) for item in queue])
+
+
+@api.route('/users/<int:user_id>/in-progress', methods=['GET'])
+@authorized
+def get_user_in_progress(user_id):
+    """
+    Get a user's unfinished episodes, most recently played first
+    ---
+    tags:
+      - Progress
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose episodes are requested
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Number of episodes to return, capped at MAX_PAGE_SIZE
+    responses:
+      200:
+        description: >
+          Episodes with a progress between 0 and 100 (exclusive), each as
+          {progress, podcast, subscription}
+    """
+    _, limit = page_args()
+    rows = db.session.execute(queries.in_progress(user_id, limit))
+
+    entries = []
+    for row in rows.mappings():
+        entry = {part: {} for part, _, _ in queries.IN_PROGRESS_FIELDS}
+        for key, value in row.items():
+            part, name = key.split('.')
+            entry[part][name] = value
+        entries.append(entry)
+    return jsonify(entries)
+
+
+@api.route('/users/<int:user_id>/events', methods=['GET'])
+@authorized
+@query_token
+def get_user_events(user_id):
+    """
+    Stream a user's progress, queue and subscription changes as server-sent events
+    ---
+    tags:
+      - User
+    produces:
+      - text/event-stream
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose changes are streamed
+      - name: Last-Event-ID
+        in: header
+        type: integer
+        required: false
+        description: >
+          The last event ID received; changes made since are sent first. Set
+          by EventSource on reconnect
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: A sync version to resume from, for the first connection
+      - name: access_token
+        in: query
+        type: string
+        required: false
+        description: The bearer token, for EventSource clients that cannot send headers
+    responses:
+      200:
+        description: >
+          Missed changes (when resuming), a `ready` event with the current
+          version, then one `progress`,
+          `queue` or `subscription` event per written row (data is the row)
+          and a `<table>.deleted` event per deleted row (data is {id}). Event
+          IDs are versions. A `resync` event ({since}) means changes were
+          dropped: delta-sync each list with that version
+      404:
+        description: User not found
+      503:
+        description: Too many open streams in this process
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    if db.session.execute(db.select(User.id).where(User.id == user_id)).first() is None:
+        return jsonify({'message': 'User not found'}), 404
+
+    hub = event_hub.hub()
+    subscriber = hub.subscribe(user_id)
+    if subscriber is None:
+        return jsonify({'message': 'Too many open event streams'}), 503, {'Retry-After': '5'}
+    try:
+        backlog = hub.catch_up(subscriber, since) if since is not None else ''
+    except Exception:
+        hub.unsubscribe(subscriber)
+        raise
+    heartbeat = current_app.config['EVENTS_HEARTBEAT_INTERVAL']
+
+    def generate():
+        # Runs after the request's session is gone: only the hub touches the database
+        try:
+            yield backlog
+            yield format_event('ready', {'version': subscriber.version}, subscriber.version)
+            while True:
+                text = subscriber.wait(heartbeat)
+                if text is None:
+                    return
+                yield text or ': keep-alive\n\n'
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype=EVENT_STREAM,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@api.route('/queue/<int:user_id>/next', methods=['GET'])
+@authorized
+def get_queue_next(user_id):
+    """
+    Get the next entry in a user's queue
+    ---
+    tags:
+      - Queue
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose queue is read
+    responses:
+      200:
+        description: The first entry of the queue
+        schema:
+          $ref: '#/definitions/Queue'
+      404:
+        description: The queue is empty
+    """
+    item = db.session.execute(queries.user_queue(user_id).limit(1)).first()
+    if item is None:
+        return jsonify({'message': 'Queue is empty'}), 404
+    return jsonify(Queue.row_dict(item))
+
+
+@api.route('/queue/<int:user_id>/next', methods=['DELETE'])
+@authorized
+def pop_queue_next(user_id):
+    """
+    Remove and return the next entry in a user's queue
+    ---
+    tags:
+      - Queue
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose queue is popped
+    responses:
+      200:
+        description: The entry that was removed
+        schema:
+          $ref: '#/definitions/Queue'
+      404:
+        description: The queue is empty
+    """
+    item = Queue.query.filter_by(user_id=user_id).order_by(Queue.position).first()
+    if item is None:
+        return jsonify({'message': 'Queue is empty'}), 404
+    item_data = item.to_dict()
+    db.session.delete(item)
+    db.session.commit()
+    return jsonify(item_data)
+
+
+@api.route('/queue', methods=['POST'])
+@authenticated
 def add_to_queue():
     """
-    Add a podcast to the queue
+    Add a podcast to a user's queue
     ---
     tags:
       - Queue
@@ -893,7 +1522,19 @@ def add_to_queue():
         in: body
         required: true
         schema:
-          $ref: '#/definitions/user1'
+          properties:
+            user_id:
+              type: integer
+              description: The ID of the user owning the queue; defaults to the token's user
+            podcast_id:
+              type: integer
+              description: The ID of the podcast to queue
+            after_id:
+              type: integer
+              description: Insert right after this queue entry
+            before_id:
+              type: integer
+              description: Insert right before this queue entry (default is the end)
     responses:
       201:
         description: Successfully added podcast to the queue
@@ -901,18 +1542,47 @@ def add_to_queue():
           $ref: '#/definitions/Queue'
       400:
         description: Bad request - invalid input
+      404:
+        description: User, podcast or neighbouring queue entry not found
+      409:
+        description: Another entry was inserted at the same spot, retry
     """
-    data = request.get_json()
-    new_podcast = Queue(name=data['name'], description=data['description'], author=data['author'], audio_link=data['audio_link'])
-    db.session.add(new_podcast)
-    db.session.commit()
-    result = queue_schema.dump(new_podcast)
-    return jsonify(result), 201
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    user_id = data.get('user_id', get_user_id())
+    podcast_id = data.get('podcast_id')
+    if not is_integer(user_id) or not is_integer(podcast_id):
+        return jsonify({'message': 'Please provide user_id and podcast_id.'}), 400
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    neighbours = _queue_neighbours(data)
+    if neighbours is None:
+        return jsonify({'message': 'Give at most one of after_id and before_id, as integers.'}), 400
+
+    exists = db.session.execute(db.select(
+        db.select(User.id).where(User.id == user_id).exists(),
+        db.select(Podcast.id).where(Podcast.id == podcast_id).exists())).one()
+    if not all(exists):
+        return jsonify({'message': 'User or podcast not found'}), 404
+    position = _queue_slot(user_id, *neighbours)
+    if position is None:
+        return jsonify({'message': 'Queue item not found'}), 404
+
+    item = Queue(user_id=user_id, podcast_id=podcast_id, position=position)
+    db.session.add(item)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Queue changed concurrently, please retry'}), 409
+    return jsonify(item.to_dict()), 201
 
-@app.route('/queue/<int:queue_id>', methods=['PUT'])
+@api.route('/queue/<int:queue_id>', methods=['PUT'])
+@authenticated
 def update_queue(queue_id):
     """
-    Update a podcast in the queue
+    Move an entry within its queue
     ---
     tags:
       - Queue
@@ -920,37 +1590,60 @@ def update_queue(queue_id):
       - name: queue_id
         in: path
         required: true
-        description: ID of the podcast in the queue to update
+        description: ID of the queue entry to move
         type: integer
       - name: body
         in: body
         required: true
         schema:
-          $ref: '#/definitions/QueueInput'
+          properties:
+            after_id:
+              type: integer
+              description: Move right after this queue entry
+            before_id:
+              type: integer
+              description: Move right before this queue entry (default is the end)
     responses:
       200:
-        description: Successfully updated podcast in the queue
+        description: Successfully moved the entry
         schema:
           $ref: '#/definitions/Queue'
       400:
         description: Bad request - invalid input
       404:
-        description: Podcast in queue not found
+        description: Queue entry or neighbour not found
+      409:
+        description: Another entry was moved to the same spot, retry
     """
-    data = request.get_json()
-    podcast = Queue.query.get(queue_id)
-    if not podcast:
-        return jsonify({'message': 'Podcast not found in queue'}), 404
-    podcast.name = data['name']
-    podcast.description = data['description']
-    podcast.author = data['author']
-    podcast.audio_link = data['audio_link']
-    db.session.commit()
-    result = queue_schema.dump(podcast)
-    return jsonify(result)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    item = db.session.get(Queue, queue_id)
+    if item is None:
+        return jsonify({'message': 'Queue item not found'}), 404
+    if not may_act_for(item.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    neighbours = _queue_neighbours(data)
+    if neighbours is None:
+        return jsonify({'message': 'Give at most one of after_id and before_id, as integers.'}), 400
+    if queue_id in neighbours:
+        return jsonify({'message': 'Cannot move an entry relative to itself'}), 400
+
+    position = _queue_slot(item.user_id, *neighbours)
+    if position is None:
+        return jsonify({'message': 'Queue item not found'}), 404
+
+    item.position = position
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Queue changed concurrently, please retry'}), 409
+    return jsonify(item.to_dict())
 
 
-@app.route('/queue/<int:queue_id>', methods=['DELETE'])
+@api.route('/queue/<int:queue_id>', methods=['DELETE'])
+@authenticated
 def delete_queue(queue_id):
     """
     Delete a queue item by ID
@@ -970,16 +1663,20 @@ def delete_queue(queue_id):
         description: The queue item was not found
     """
     queue_item = Queue.query.filter_by(id=queue_id).first()
-    if queue_item:
-        db.session.delete(queue_item)
-        db.session.commit()
-        return '', 204
-    else:
-        abort(404)
+    if queue_item is None:
+        return jsonify({'message': 'Queue item not found'}), 404
+    if not may_act_for(queue_item.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    db.session.delete(queue_item)
+    db.session.commit()
+    return '', 204
 
 
 
-@app.route('/subscriptions', methods=['GET'])
+@api.route('/subscriptions', methods=['GET'])
+@authenticated
+@conditional('subscription', per_user=True)
+@response_cache.cached('subscriptions', 'subscription', per_user=True)
 def get_subscriptions():
     """
     Get all subscriptions
@@ -989,19 +1686,66 @@ def get_subscriptions():
     ---
     tags:
       - Subscription
+    produces:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - return only rows with an ID greater than this one
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Cursor mode - page size, capped at MAX_PAGE_SIZE
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Delta mode - only rows changed after this version, plus deleted IDs
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only this user's rows; defaults to the token's user
     responses:
         200:
-            description: List of subscriptions
+            description: >
+              List of subscriptions, {items, next} when after/limit are given,
+              or {items, deleted, version} when since is given. With
+              Accept: application/x-ndjson all rows are streamed one per line.
             schema:
                 type: array
                 items:
                     $ref: '#/definitions/Subscription'
     """
-    subscriptions = Subscription.query.all()
-    return jsonify([s.to_dict() for s in subscriptions])
+    user_id = request.args.get('user_id', get_user_id(), type=int)
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if 'since' in request.args:
+        since = request.args.get('since', 0, type=int)
+        subscriptions, deleted, version = changes_since(Subscription, since, user_id)
+        return jsonify({'items': [Subscription.row_dict(s) for s in subscriptions],
+                        'deleted': deleted, 'version': version})
 
+    if cursor_requested():
+        subscriptions, next_cursor = keyset_page(queries.owned(Subscription, user_id),
+                                                 Subscription.id)
+        return jsonify({'items': [Subscription.row_dict(s) for s in subscriptions],
+                        'next': next_cursor})
 
-@app.route('/subscriptions', methods=['POST'])
+    if wants_ndjson():
+        return ndjson_response(Subscription, queries.owned(Subscription, user_id))
+
+    subscriptions = db.session.execute(queries.owned(Subscription, user_id))
+    return jsonify([Subscription.row_dict(s) for s in subscriptions])
+
+
+@api.route('/subscriptions', methods=['POST'])
+@authenticated
 def add_subscription():
     """
     Add a new subscription
@@ -1020,13 +1764,18 @@ def add_subscription():
                 $ref: '#/definitions/Subscription'
     """
     data = request.get_json()
+    data.setdefault('user_id', get_user_id())
+    if not may_act_for(data['user_id']):
+        return jsonify({'message': 'Forbidden'}), 403
     subscription = Subscription(**data)
     db.session.add(subscription)
     db.session.commit()
+    response_cache.invalidate('subscriptions')
     return jsonify(subscription.to_dict()), 201
 
 
-@app.route('/subscriptions/<int:subscription_id>', methods=['PUT'])
+@api.route('/subscriptions/<int:subscription_id>', methods=['PUT'])
+@authenticated
 def update_subscription(subscription_id):
     """
     Update a subscription by ID.
@@ -1083,6 +1832,8 @@ def update_subscription(subscription_id):
         description: Subscription not found
     """
     subscription = Subscription.query.get_or_404(subscription_id)
+    if not may_act_for(subscription.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
 
     title = request.form.get('title')
     description = request.form.get('description')
@@ -1108,12 +1859,94 @@ def update_subscription(subscription_id):
         subscription.author_name = author_name
 
     db.session.commit()
+    response_cache.invalidate(f'subscription:{subscription_id}', 'subscriptions')
 
     return jsonify({'message': 'Subscription updated successfully'})
 
 
+def _insert_subscription_batch(batch, version):
+    """Bulk insert ``batch``; the first batch of a request allocates the change version."""
+    if version is None:
+        version = next_version(db.session, 'subscription')
+    db.session.execute(db.insert(Subscription), [dict(row, version=version) for row in batch])
+    return version
+
+
+@api.route('/subscriptions/import', methods=['POST'])
+@authenticated
+def import_subscriptions():
+    """
+    Import subscriptions from an OPML file
+    ---
+    tags:
+      - Subscription
+    consumes:
+      - multipart/form-data
+      - text/x-opml
+    parameters:
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: The ID of the user to subscribe; defaults to the token's user
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: The OPML document (or send it as the raw request body)
+    responses:
+      201:
+        description: Number of feeds imported and of feeds skipped as duplicates
+      400:
+        description: Missing user_id or malformed OPML
+      404:
+        description: User not found
+    """
+    user_id = request.args.get('user_id', get_user_id(), type=int)
+    if user_id is None:
+        return jsonify({'message': 'Please provide user_id.'}), 400
+    if not may_act_for(user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    if db.session.get(User, user_id) is None:
+        return jsonify({'message': 'User not found'}), 404
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+
+    known = set(db.session.scalars(
+        db.select(Subscription.url).where(Subscription.user_id == user_id)))
+    subscribed_on = datetime.datetime.utcnow()
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    imported = skipped = 0
+    version = None
+    batch = []
+    try:
+        for feed in iter_feeds(stream):
+            if feed['url'] in known:
+                skipped += 1
+                continue
+            known.add(feed['url'])
+            batch.append(dict(feed, user_id=user_id, subscribed_on=subscribed_on))
+            if len(batch) >= batch_size:
+                version = _insert_subscription_batch(batch, version)
+                imported += len(batch)
+                batch = []
+        if batch:
+            version = _insert_subscription_batch(batch, version)
+            imported += len(batch)
+    except ParseError as e:
+        db.session.rollback()
+        return jsonify({'message': f'Invalid OPML: {e}'}), 400
+    if imported:
+        db.session.commit()
+        response_cache.invalidate('subscriptions')
+
+    return jsonify({'imported': imported, 'skipped': skipped}), 201
+
+
 # GET a specific subscription
-@app.route('/subscriptions/<int:subscription_id>', methods=['GET'])
+@api.route('/subscriptions/<int:subscription_id>', methods=['GET'])
+@authenticated
+@conditional('subscription', per_user=True)
+@response_cache.cached('subscription:{subscription_id}', 'subscription', per_user=True)
 def get_subscription(subscription_id):
     """
     Get details about a specific subscription.
@@ -1134,11 +1967,17 @@ def get_subscription(subscription_id):
       404:
         description: Subscription not found
     """
-    subscription = Subscription.query.get_or_404(subscription_id)
-    return jsonify(subscription.serialize())
+    subscription = db.session.execute(
+        Subscription.projection().where(Subscription.id == subscription_id)).first()
+    if subscription is None:
+        return jsonify({'message': 'Subscription not found'}), 404
+    if not may_act_for(subscription.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(Subscription.row_dict(subscription))
 
 # CREATE a new subscription
-@app.route('/subscriptions', methods=['POST'])
+@api.route('/subscriptions', methods=['POST'])
+@authenticated
 def create_subscription():
     """
     Add a new subscription.
@@ -1161,6 +2000,9 @@ def create_subscription():
         description: Invalid subscription data
     """
     data = request.get_json()
+    data.setdefault('user_id', get_user_id())
+    if not may_act_for(data['user_id']):
+        return jsonify({'message': 'Forbidden'}), 403
     subscription = Subscription(title=data['title'],
                                 description=data['description'],
                                 language=data['language'],
@@ -1172,11 +2014,13 @@ def create_subscription():
                                 author_name=data['author_name'])
     db.session.add(subscription)
     db.session.commit()
+    response_cache.invalidate('subscriptions')
     return jsonify(subscription.serialize()), 200
 
 
 # DELETE an existing subscription
-@app.route('/subscriptions/<int:subscription_id>', methods=['DELETE'])
+@api.route('/subscriptions/<int:subscription_id>', methods=['DELETE'])
+@authenticated
 def delete_subscription(subscription_id):
     """
     Delete an existing subscription.
@@ -1196,21 +2040,249 @@ def delete_subscription(subscription_id):
         description: Subscription not found
     """
     subscription = Subscription.query.get_or_404(subscription_id)
+    if not may_act_for(subscription.user_id):
+        return jsonify({'message': 'Forbidden'}), 403
     db.session.delete(subscription)
     db.session.commit()
+    response_cache.invalidate(f'subscription:{subscription_id}', 'subscriptions')
+    return '', 204
+
+
+@api.route('/search', methods=['GET'])
+@authenticated
+def search_catalog():
+    """
+    Full-text search over podcasts and subscriptions
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: >
+          Words to look for in podcast titles and authors and in subscription
+          titles and descriptions; the last word also matches as a prefix
+      - name: after
+        in: query
+        type: integer
+        required: false
+        description: The next cursor of the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size, capped at MAX_PAGE_SIZE
+    responses:
+      200:
+        description: >
+          {items, next}; items are podcast or subscription rows with their
+          type and bm25 rank, best match first. With a token, only the
+          token's user's subscriptions and their podcasts are searched
+      400:
+        description: Missing q parameter
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'Missing required parameters'}), 400
+    offset, limit = page_args()
+    items, next_cursor = search(query, offset, limit, get_user_id())
+    return jsonify({'items': items, 'next': next_cursor})
+
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Response cache counters
+    ---
+    tags:
+      - Cache
+    responses:
+      200:
+        description: Entry count, hits, misses and evictions of the response cache
+    """
+    return jsonify(response_cache.stats())
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Request metrics in the Prometheus text format
+    ---
+    tags:
+      - Metrics
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: >
+          Per-route request counts by status, in-flight requests, and
+          histograms of latency, response size and SQL queries and time per
+          request, for this process
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def create_app(config=None):
+    """
+    Build and configure an app; ``config`` overrides any of the defaults below.
+
+    Nothing connects to the database here, so a pre-forking server can build
+    the app once in its master process and fork workers from it.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DEFAULT_PAGE_SIZE'] = 100
+    app.config['MAX_PAGE_SIZE'] = 1000
+    app.config['MAX_BATCH_SIZE'] = 500
+    app.config['NDJSON_CHUNK_SIZE'] = 1000
+    app.config['IMPORT_BATCH_SIZE'] = 500
+    # Coalesce progress heartbeats in memory and write them in bulk
+    app.config['PROGRESS_WRITE_BEHIND'] = False
+    app.config['PROGRESS_FLUSH_INTERVAL_MS'] = 1000
+    app.config['PROGRESS_FLUSH_MAX_ENTRIES'] = 500
+    # 'local' (per process), 'shared' (a `flask cache-server` process) or None. The
+    # shared cache listens on a Unix socket path or a loopback (host, port) and
+    # needs RESPONSE_CACHE_AUTHKEY or SECRET_KEY
+    app.config['RESPONSE_CACHE_BACKEND'] = 'local'
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 1024
+    app.config['RESPONSE_CACHE_TTL'] = 60
+    # Seconds between background feed refreshes; None leaves it to `flask refresh-feeds`
+    app.config['FEED_REFRESH_INTERVAL'] = None
+    app.config['FEED_REFRESH_WORKERS'] = 8
+    # Most fetches in flight against one feed host at once
+    app.config['FEED_PER_HOST_LIMIT'] = 2
+    # Feed URLs come from users: only public hosts are fetched unless this is set
+    app.config['FEED_ALLOW_PRIVATE_ADDRESSES'] = False
+    app.config['FEED_MAX_REDIRECTS'] = 5
+    # How deep search results page; each index keeps only its best this many
+    app.config['SEARCH_MAX_CANDIDATES'] = 1000
+    # Opt-in (e.g. on staging): X-DB-* headers, N+1 warnings and a slow-query log
+    app.config['SQL_PROFILER_ENABLED'] = bool(os.environ.get('SQL_PROFILER'))
+    app.config['SQL_PROFILER_SLOW_MS'] = 50
+    # Serve the spec written by `flask build-spec`; set APISPEC_PARSE_DOCSTRINGS=0 in
+    # production so workers never fall back to parsing the route docstrings
+    app.config['APISPEC_PARSE_DOCSTRINGS'] = (
+        os.environ.get('APISPEC_PARSE_DOCSTRINGS', '1') != '0')
+    # Signs auth tokens; set it in production so tokens outlive the process
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config['AUTH_REQUIRED'] = os.environ.get('AUTH_REQUIRED') == '1'
+    app.config['SWAGGER'] = {
+            "swagger_version": "2.0",
+            "title": "Podcast Sync - REST API",
+            "description": "",
+            }
+    # Then a Python settings file named by PODCAST_SYNC_SETTINGS, then FLASK_*
+    # variables (values parsed as JSON: FLASK_PROGRESS_WRITE_BEHIND=true)
+    app.config.from_envvar('PODCAST_SYNC_SETTINGS', silent=True)
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+    configure_database(app)
+
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(app, db.engine)
+        log_database_settings(app, db.engine)
+        dispose_engine_after_fork(db.engine)
+        metrics.init_app(app, db.engine)
+        sql_profiler.init_app(app, db.engine)
+
+    ma.init_app(app)
+    progress_buffer.init_app(app)
+    response_cache.init_app(app)
+    feed_refresher.init_app(app)
+    event_hub.init_app(app)
+    auth.init_app(app)
+    swagger.init_app(app)
+    compression.init_app(app)
+    app.register_blueprint(api)
+    return app
 
 
 def get_app_db():
-    return (app, db)
+    return (create_app(), db)
 
 
-@app.cli.command('initdb')
+@api.cli.command('initdb')
 def initdb_command():
     """Initializes the database."""
     db.create_all()
     print('Initialized the database.')
 
 
+@api.cli.command('seed')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--subs-per-user', default=10, show_default=True)
+@click.option('--episodes-per-sub', default=50, show_default=True)
+@click.option('--progress-per-user', default=100, show_default=True)
+@click.option('--queue-per-user', default=10, show_default=True)
+@click.option('--seed', 'seed_value', default=0, show_default=True,
+              help='Same seed and sizes, same data.')
+def seed_command(users, subs_per_user, episodes_per_sub, progress_per_user, queue_per_user,
+                 seed_value):
+    """Fills an empty database with synthetic data for every model."""
+    db.create_all()
+    if db.session.scalar(db.select(User.id).limit(1)) is not None:
+        raise click.ClickException('The database already has users; seed an empty one.')
+    db.session.close()
+    seed(db.engine, users, subs_per_user, episodes_per_sub, progress_per_user, queue_per_user,
+         seed=seed_value, echo=click.echo)
+
+
+@api.cli.command('db-settings')
+def db_settings_command():
+    """Prints the effective database, pool and PRAGMA settings."""
+    with db.engine.connect() as connection:
+        settings = describe_connection(db.engine, connection.connection.dbapi_connection)
+    for name, value in settings.items():
+        print(f'{name}: {value}')
+
+
+@api.cli.command('build-spec')
+def build_spec_command():
+    """Writes the OpenAPI spec to APISPEC_FILE so workers don't generate it."""
+    print(f'Wrote {swagger.build(current_app._get_current_object())}')
+
+
+@api.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fails if any hot query falls back to a full table scan or a temporary sort."""
+    failed = False
+    for name, (plan, slow) in check_query_plans().items():
+        print(f"{'FAIL' if slow else 'ok'}  {name}: {'; '.join(plan)}")
+        failed = failed or bool(slow)
+    if failed:
+        raise SystemExit(1)
+
+
+@api.cli.command('refresh-feeds')
+@click.option('--all', 'force', is_flag=True, help='Refresh every feed, not only the due ones.')
+def refresh_feeds_command(force):
+    """Fetches subscription feeds and stores new episodes."""
+    stats = feed_refresher.refresh(force=force)
+    print(', '.join(f'{name}: {value}' for name, value in stats.items()))
+
+
+@api.cli.command('cache-server')
+def cache_server_command():
+    """Runs the response cache shared by workers using the 'shared' backend."""
+    config = current_app.config
+    try:
+        address, authkey = shared_cache_settings(config)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f'Serving response cache on {address}')
+    serve_shared_cache(address, authkey, config['RESPONSE_CACHE_MAX_ENTRIES'],
+                       config['RESPONSE_CACHE_TTL'])
+
+
 
 def run():
+    """Development server with the reloader; see app.serve for production."""
+    app = create_app()
+    # With the reloader only the child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        with app.app_context():
+            feed_refresher.start()
     app.run(debug=True)
@@ -1,11 +1,14 @@
 from flask_migrate import Migrate
-from main import get_app_db
-from models import User, Podcast, Progress, Queue, Subscription
+from app.main import get_app_db
+from app.models import User, Podcast, Progress, Queue, Subscription
+from app.search import include_name
 
 from flask_sqlalchemy import SQLAlchemy
     
 app, db = get_app_db()
-migrate = Migrate(app, db)
+# SQLite can't ALTER most things in place, so let alembic rebuild tables in batches.
+# The search indexes are managed by hand in migrations, not autogenerated.
+migrate = Migrate(app, db, render_as_batch=True, include_name=include_name)
 
 if __name__ == '__main__':
   app.run()
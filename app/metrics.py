@@ -0,0 +1,213 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+ROUTE_LABELS = ('method', 'route')
+
+# name: (type, help, label names, buckets)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests handled, by final status.', ROUTE_LABELS + ('status',), None),
+    'http_requests_in_flight': (
+        'gauge', 'Requests currently being handled.', ROUTE_LABELS, None),
+    'http_request_duration_seconds': (
+        'histogram', 'Time from routing to the end of the response.', ROUTE_LABELS,
+        LATENCY_BUCKETS),
+    'http_response_size_bytes': (
+        'histogram', 'Response body size; streamed responses are not measured.', ROUTE_LABELS,
+        SIZE_BUCKETS),
+    'http_request_db_queries': (
+        'histogram', 'SQL statements executed per request.', ROUTE_LABELS, QUERY_BUCKETS),
+    'http_request_db_seconds': (
+        'histogram', 'Time spent executing SQL per request.', ROUTE_LABELS, LATENCY_BUCKETS),
+}
+
+
+class _Shard:
+    """The values recorded by one thread; only that thread ever writes to it."""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}
+
+    def merge_into(self, totals):
+        for key, value in list(self.values.items()):
+            if isinstance(value, list):
+                total = totals.setdefault(key, [0] * len(value))
+                for i, part in enumerate(value):
+                    total[i] += part
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+
+class Registry:
+    """
+    Counters, gauges and histograms sharded per thread.
+
+    Recording touches only the calling thread's shard, so it never takes a
+    lock; the registry lock is taken once per new thread and on each scrape,
+    which sums the shards. Shards of finished threads are folded into a
+    retired total on scrape, so per-request threads don't pile up.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+
+    def _values(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+        return shard.values
+
+    def inc(self, name, labels, amount=1):
+        """Add ``amount`` to a counter, or to a gauge when negative."""
+        values = self._values()
+        key = (name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Record one histogram sample: per-bucket counts, then the sum."""
+        buckets = self.metrics[name][3]
+        values = self._values()
+        key = (name, labels)
+        series = values.get(key)
+        if series is None:
+            series = values[key] = [0] * (len(buckets) + 2)
+        series[bisect_left(buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self):
+        """``{(name, labels): value}`` summed over every thread."""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    shard.merge_into(self._retired)
+            self._shards = live
+            totals = {key: list(value) if isinstance(value, list) else value
+                      for key, value in self._retired.items()}
+            for shard in live:
+                shard.merge_into(totals)
+        return totals
+
+    def render(self):
+        """The collected values in the Prometheus text exposition format."""
+        by_name = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in self.metrics.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in by_name.get(name, ()):
+                pairs = list(zip(label_names, labels))
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Per-route request metrics, exposed by ``render()`` for a /metrics endpoint.
+
+    Requests are labelled with their URL rule (``/podcasts/<int:podcast_id>``)
+    rather than the path, so the number of series stays bounded. SQL is timed
+    with engine events and attributed to the request running on that thread.
+    """
+
+    def __init__(self, app=None, engine=None):
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.extensions['metrics'] = Registry()
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def registry(self):
+        """The current app's registry."""
+        return current_app.extensions['metrics']
+
+    def render(self):
+        return self.registry.render()
+
+    def _before_request(self):
+        g.metrics_labels = (request.method,
+                            request.url_rule.rule if request.url_rule else 'unmatched')
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_seconds = 0.0
+        self.registry.inc('http_requests_in_flight', g.metrics_labels)
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        if not response.is_streamed:
+            self.registry.observe('http_response_size_bytes', g.metrics_labels,
+                                  response.calculate_content_length() or 0)
+        return response
+
+    def _teardown_request(self, exc):
+        # Runs after streamed bodies are sent, and also for unhandled errors
+        labels = g.pop('metrics_labels', None)
+        if labels is None:
+            return
+        registry = self.registry
+        registry.inc('http_requests_in_flight', labels, -1)
+        status = g.get('metrics_status', 500) if exc is None else 500
+        registry.inc('http_requests_total', labels + (str(status),))
+        registry.observe('http_request_duration_seconds', labels,
+                         time.perf_counter() - g.metrics_start)
+        registry.observe('http_request_db_queries', labels, g.metrics_db_queries)
+        registry.observe('http_request_db_seconds', labels, g.metrics_db_seconds)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'metrics_start', None)
+        if start is None or not has_request_context() or 'metrics_labels' not in g:
+            return
+        g.metrics_db_queries += 1
+        g.metrics_db_seconds += time.perf_counter() - start
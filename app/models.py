@@ -1,20 +1,84 @@
+import datetime
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 db = SQLAlchemy()
 
-class User(db.Model):
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+class Serialized:
+    """
+    Models name the columns they emit in ``__serialized__``.
+
+    Read endpoints select just those columns with ``projection()`` and turn the
+    plain rows into dicts with ``row_dict()``, so large listings never build
+    identity-mapped ORM instances or load columns such as passwords.
+    """
+    __serialized__ = ()
+
+    @classmethod
+    def columns(cls):
+        return [getattr(cls, name) for name in cls.__serialized__]
+
+    @classmethod
+    def projection(cls):
+        return db.select(*cls.columns())
+
+    @staticmethod
+    def row_dict(row):
+        return {name: _plain(value) for name, value in row._asdict().items()}
+
+    def to_dict(self):
+        return {name: _plain(getattr(self, name)) for name in self.__serialized__}
+
+
+class User(Serialized, db.Model):
+    __serialized__ = ('id', 'name', 'email')
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(50), nullable=False, index=True)
     password = db.Column(db.String(50), nullable=False)
     salt = db.Column(db.String(50), nullable=False)
 
-class Progress(db.Model):
+class Progress(Serialized, db.Model):
+    __serialized__ = ('id', 'user_id', 'podcast_id', 'progress', 'version')
+    __table_args__ = (
+        db.Index('ix_progress_user_id_podcast_id', 'user_id', 'podcast_id', unique=True),
+        # A user's most recently updated progress first, for "continue listening"
+        db.Index('ix_progress_user_id_version', 'user_id', 'version'),
+        # A user's progress in ID order, for keyset pages
+        db.Index('ix_progress_user_id_id', 'user_id', 'id'),
+        # Never reuse the ID of a deleted (tombstoned) row
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    # user_id lookups are served by the leading column of the unique index above
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    podcast_id = db.Column(db.Integer, db.ForeignKey('podcast.id'), nullable=False)
+    podcast_id = db.Column(db.Integer, db.ForeignKey('podcast.id'), nullable=False, index=True)
     progress = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    @classmethod
+    def upsert(cls):
+        """INSERT ... ON CONFLICT (user_id, podcast_id) DO UPDATE SET progress, version."""
+        stmt = sqlite_insert(cls)
+        return stmt.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.podcast_id],
+            set_={'progress': stmt.excluded.progress, 'version': stmt.excluded.version})
+
+class Podcast(Serialized, db.Model):
+    __serialized__ = ('id', 'title', 'author_name', 'image_url', 'subscription_id', 'url')
+    # One row per episode of a subscription; feed refreshes rely on it to skip
+    # episodes they already stored. Also serves subscription_id lookups.
+    __table_args__ = (
+        db.Index('ix_podcast_subscription_id_url', 'subscription_id', 'url', unique=True),
+    )
 
-class Podcast(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(50), nullable=False)
     author_name = db.Column(db.String, nullable=True)
@@ -22,18 +86,56 @@ class Podcast(db.Model):
     subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'), nullable=False)
     url = db.Column(db.String, nullable=False)
 
-class Queue(db.Model):
+class Queue(Serialized, db.Model):
+    __serialized__ = ('id', 'user_id', 'podcast_id', 'position', 'version')
+    # Entries are ordered by a fractional key (see app.ordering), so inserting
+    # or moving one entry only ever writes that entry's row. The index also
+    # serves plain user_id lookups.
+    __table_args__ = (
+        db.Index('ix_queue_user_id_position', 'user_id', 'position', unique=True),
+        db.Index('ix_queue_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    podcasts = db.Column(db.Integer, nullable=True)
+    podcast_id = db.Column(db.Integer, db.ForeignKey('podcast.id'), nullable=False)
+    position = db.Column(db.String(64), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class Subscription(Serialized, db.Model):
+    __serialized__ = ('id', 'title', 'description', 'language', 'pubDate', 'user_id',
+                      'subscribed_on', 'image_url', 'url', 'version')
+    __table_args__ = {'sqlite_autoincrement': True}
 
-class Subscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(500))
     language = db.Column(db.String(50))
     pubDate = db.Column(db.String(50))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     subscribed_on = db.Column(db.DateTime, nullable=False)
     image_url = db.Column(db.String(200))
     url = db.Column(db.String(200), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+    # Feed refresh bookkeeping, not part of the API representation
+    feed_etag = db.Column(db.String(200))
+    feed_last_modified = db.Column(db.String(64))
+    feed_next_check_at = db.Column(db.DateTime, index=True)
+    feed_backoff = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class ChangeCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+class Tombstone(db.Model):
+    __table_args__ = (
+        db.Index('ix_tombstone_table_name_version', 'table_name', 'version'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    version = db.Column(db.Integer, nullable=False)
@@ -0,0 +1,33 @@
+import json
+
+from flask import Response, current_app, request, stream_with_context
+
+from app.models import db
+
+NDJSON = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best == NDJSON
+
+
+def ndjson_response(model, stmt=None):
+    """
+    Stream every row of ``model`` (of the ``stmt`` select) as newline-delimited JSON.
+
+    Rows are read from a streaming cursor NDJSON_CHUNK_SIZE at a time and each
+    chunk is written out before the next one is fetched, so memory stays flat
+    and the first bytes leave as soon as the first chunk is read.
+    """
+    chunk_size = current_app.config['NDJSON_CHUNK_SIZE']
+    if stmt is None:
+        stmt = model.projection()
+    stmt = stmt.order_by(model.id).execution_options(
+        stream_results=True, yield_per=chunk_size)
+
+    def generate():
+        for rows in db.session.execute(stmt).partitions():
+            yield ''.join(json.dumps(model.row_dict(row), separators=(',', ':')) + '\n'
+                          for row in rows)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
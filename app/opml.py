@@ -0,0 +1,23 @@
+import xml.etree.ElementTree as ET
+
+
+def iter_feeds(stream):
+    """
+    Yield one dict per feed ``<outline xmlUrl=...>`` in an OPML document.
+
+    The document is parsed incrementally and every element is cleared once
+    handled, so memory does not grow with the number of feeds.
+    """
+    for event, element in ET.iterparse(stream, events=('end',)):
+        if element.tag != 'outline':
+            continue
+        url = element.get('xmlUrl')
+        if url:
+            yield {
+                'url': url.strip(),
+                'title': element.get('title') or element.get('text') or url.strip(),
+                'description': element.get('description'),
+                'language': element.get('language'),
+                'image_url': element.get('imageUrl'),
+            }
+        element.clear()
@@ -0,0 +1,121 @@
+"""
+Fractional order keys.
+
+A key is a string that sorts (byte-wise, as SQLite's default collation does)
+between its neighbours, so an item can be inserted or moved by writing only
+its own row. Keys are an integer part, whose first character encodes its
+length, followed by a base-62 fraction without trailing zeros. Appending
+increments the integer part, so keys stay short even for long lists.
+"""
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+SMALLEST_INTEGER = 'A' + DIGITS[0] * 26
+
+
+def _integer_length(head):
+    if 'a' <= head <= 'z':
+        return ord(head) - ord('a') + 2
+    if 'A' <= head <= 'Z':
+        return ord('Z') - ord(head) + 2
+    raise ValueError(f'Invalid order key head: {head!r}')
+
+
+def _split(key):
+    integer = key[:_integer_length(key[0])]
+    return integer, key[len(integer):]
+
+
+def _increment_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[0]
+    if head == 'Z':
+        return 'a' + DIGITS[0]
+    if head == 'z':
+        return None
+    head = chr(ord(head) + 1)
+    if head > 'a':
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _decrement_integer(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + ''.join(digits)
+        digits[i] = DIGITS[-1]
+    if head == 'a':
+        return 'Z' + DIGITS[-1]
+    if head == 'A':
+        return None
+    head = chr(ord(head) - 1)
+    if head < 'Z':
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + ''.join(digits)
+
+
+def _midpoint(a, b):
+    """A fraction strictly between fractions ``a`` and ``b`` (``None`` = 1)."""
+    if b is not None:
+        n = 0
+        while (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(a, b):
+    """
+    A key sorting strictly between ``a`` and ``b``.
+
+    ``a=None`` means "before the first item" and ``b=None`` means "after the
+    last item"; ``key_between(None, None)`` starts an empty list.
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f'{a!r} must sort before {b!r}')
+
+    if a is None:
+        if b is None:
+            return 'a' + DIGITS[0]
+        integer, fraction = _split(b)
+        if integer == SMALLEST_INTEGER:
+            if not fraction:
+                raise ValueError('Cannot order before the smallest key')
+            return integer + _midpoint('', fraction)
+        if integer < b:
+            return integer
+        key = _decrement_integer(integer)
+        if key is None:
+            raise ValueError('Cannot order before the smallest key')
+        return key
+
+    integer, fraction = _split(a)
+    if b is None:
+        key = _increment_integer(integer)
+        return integer + _midpoint(fraction, None) if key is None else key
+
+    integer_b, fraction_b = _split(b)
+    if integer == integer_b:
+        return integer + _midpoint(fraction, fraction_b)
+    key = _increment_integer(integer)
+    if key is None:
+        raise ValueError('Cannot order after the largest key')
+    return key if key < b else integer + _midpoint(fraction, None)
@@ -0,0 +1,51 @@
+from flask import abort, current_app, jsonify, make_response, request
+
+from app.models import db
+
+
+def _int_arg(name, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(make_response(jsonify({'message': f'{name} must be an integer'}), 400))
+
+
+def cursor_requested():
+    """True when the client asked for cursor mode (``after`` and/or ``limit``)."""
+    return 'after' in request.args or 'limit' in request.args
+
+
+def page_args():
+    """
+    Read ``after``/``limit`` from the query string, clamped to the server maximum.
+
+    A value that is not an integer aborts the request with a 400.
+    """
+    after = _int_arg('after', 0)
+    limit = _int_arg('limit', current_app.config['DEFAULT_PAGE_SIZE'])
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    return after, limit
+
+
+def after_id(stmt, id_column, after, limit):
+    """``stmt`` narrowed to ``WHERE id > after ORDER BY id LIMIT limit``."""
+    return stmt.where(id_column > after).order_by(id_column).limit(limit)
+
+
+def keyset_page(stmt, id_column):
+    """
+    Fetch one page of the ``stmt`` select with ``WHERE id > after ORDER BY id LIMIT n``.
+
+    One extra row is read to find out whether another page exists, so the
+    returned cursor is ``None`` on the last page.
+    """
+    after, limit = page_args()
+    rows = db.session.execute(after_id(stmt, id_column, after, limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
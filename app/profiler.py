@@ -0,0 +1,99 @@
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+
+class SQLProfiler:
+    """
+    Opt-in per-request SQL profiling for staging.
+
+    Every statement a request runs is timed through engine events. The
+    response carries ``X-DB-Queries`` and ``X-DB-Time`` (milliseconds), and a
+    statement shape repeated SQL_PROFILER_REPEAT_THRESHOLD times within one
+    request is logged as a likely N+1 pattern. Statements slower than
+    SQL_PROFILER_SLOW_MS are logged with their ``EXPLAIN QUERY PLAN``, whether
+    or not they ran for a request.
+    """
+
+    def __init__(self, app=None, engine=None):
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        app.config.setdefault('SQL_PROFILER_ENABLED', False)
+        app.config.setdefault('SQL_PROFILER_SLOW_MS', 50)
+        app.config.setdefault('SQL_PROFILER_REPEAT_THRESHOLD', 3)
+        app.extensions['sql_profiler'] = self
+        if not app.config['SQL_PROFILER_ENABLED']:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        # Cursor events also fire outside any app context, so they are bound
+        # to the app that owns the engine
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self._after_cursor_execute(app, conn, cursor, statement, parameters, context,
+                                       executemany)
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    def _before_request(self):
+        g.profiler_statements = []
+
+    def _after_request(self, response):
+        # Statements run while a streamed body is sent come after the headers
+        statements = g.get('profiler_statements')
+        if statements is not None:
+            response.headers['X-DB-Queries'] = str(len(statements))
+            elapsed = sum(duration for _, duration in statements)
+            response.headers['X-DB-Time'] = f'{elapsed * 1000:.2f}'
+        return response
+
+    def _teardown_request(self, exc):
+        statements = g.pop('profiler_statements', None)
+        if not statements:
+            return
+        threshold = current_app.config['SQL_PROFILER_REPEAT_THRESHOLD']
+        shapes = Counter(' '.join(statement.split()) for statement, _ in statements)
+        for shape, count in shapes.most_common():
+            if count < threshold:
+                break
+            current_app.logger.warning('Possible N+1: %s %s ran the same statement %d times: %s',
+                                       request.method, request.path, count, shape)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.profiler_start = time.perf_counter()
+
+    def _after_cursor_execute(self, app, conn, cursor, statement, parameters, context,
+                              executemany):
+        start = getattr(context, 'profiler_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if has_request_context() and 'profiler_statements' in g:
+            g.profiler_statements.append((statement, duration))
+        if duration * 1000 >= app.config['SQL_PROFILER_SLOW_MS']:
+            self._log_slow(app, conn, cursor, statement, parameters, executemany, duration)
+
+    def _log_slow(self, app, conn, cursor, statement, parameters, executemany, duration):
+        plan = []
+        if conn.dialect.name == 'sqlite' and not executemany:
+            # A separate cursor on the same DBAPI connection, so the plan sees
+            # the same transaction and skips the engine events
+            explain = cursor.connection.cursor()
+            try:
+                explain.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+                plan = [row[-1] for row in explain.fetchall()]
+            except Exception:
+                plan = ['(plan unavailable)']
+            finally:
+                explain.close()
+        where = f'{request.method} {request.path}' if has_request_context() else 'background'
+        app.logger.warning('Slow query (%.1f ms) in %s: %s\n  plan: %s',
+                           duration * 1000, where, ' '.join(statement.split()),
+                           '; '.join(plan) or '-')
@@ -0,0 +1,161 @@
+import atexit
+import threading
+from contextlib import contextmanager, nullcontext
+
+from flask import current_app
+
+from app.models import db, Progress
+from app.versioning import next_version
+
+
+class ProgressBuffer:
+    """
+    Opt-in write-behind buffer for progress heartbeats.
+
+    Only the latest position per (user_id, podcast_id) is kept. Buffered rows
+    are written with one bulk upsert every PROGRESS_FLUSH_INTERVAL_MS, or as
+    soon as PROGRESS_FLUSH_MAX_ENTRIES distinct keys are waiting, and once
+    more when the process exits.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROGRESS_WRITE_BEHIND', False)
+        app.config.setdefault('PROGRESS_FLUSH_INTERVAL_MS', 1000)
+        app.config.setdefault('PROGRESS_FLUSH_MAX_ENTRIES', 500)
+        app.extensions['progress_buffer'] = _Buffer(app)
+
+    @staticmethod
+    def _buffer():
+        return current_app.extensions['progress_buffer']
+
+    @property
+    def enabled(self):
+        return current_app.config['PROGRESS_WRITE_BEHIND']
+
+    def put(self, user_id, podcast_id, progress):
+        """Buffer a position, replacing any earlier one for the same key."""
+        self._buffer().put(user_id, podcast_id, progress)
+
+    def get(self, user_id, podcast_id):
+        """Return the buffered position for a key, or None if nothing is waiting."""
+        return self._buffer().get(user_id, podcast_id)
+
+    def discarding(self, keys):
+        """
+        Context manager for writing ``keys`` straight to the table.
+
+        It drops their buffered positions and waits for a flush already
+        writing them. No flush runs until the block exits, so an older
+        buffered position cannot land after the direct write or delete.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._buffer().discarding(keys)
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        return self._buffer().flush()
+
+    def shutdown(self):
+        """Stop the flusher thread and write out whatever is still buffered."""
+        self._buffer().shutdown()
+
+
+class _Buffer:
+    """The pending positions and flusher thread of one app."""
+
+    def __init__(self, app):
+        self.app = app
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def put(self, user_id, podcast_id, progress):
+        with self._lock:
+            self._pending[(user_id, podcast_id)] = progress
+            full = len(self._pending) >= self.app.config['PROGRESS_FLUSH_MAX_ENTRIES']
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def get(self, user_id, podcast_id):
+        key = (user_id, podcast_id)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            return self._inflight.get(key)
+
+    @contextmanager
+    def discarding(self, keys):
+        with self._flush_lock:
+            with self._lock:
+                for key in keys:
+                    self._pending.pop(key, None)
+            yield
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+            if not pending:
+                return 0
+
+            rows = [{'user_id': user_id, 'podcast_id': podcast_id, 'progress': progress}
+                    for (user_id, podcast_id), progress in pending.items()]
+            with self.app.app_context():
+                try:
+                    version = next_version(db.session, 'progress')
+                    for row in rows:
+                        row['version'] = version
+                    db.session.execute(Progress.upsert(), rows)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    with self._lock:
+                        # Newer heartbeats that arrived meanwhile take precedence.
+                        for key, progress in pending.items():
+                            self._pending.setdefault(key, progress)
+                        self._inflight = {}
+                    raise
+            with self._lock:
+                self._inflight = {}
+            return len(rows)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='progress-flusher',
+                                            daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        interval = self.app.config['PROGRESS_FLUSH_INTERVAL_MS'] / 1000
+        while not self._stopped.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Progress write-behind flush failed')
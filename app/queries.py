@@ -0,0 +1,81 @@
+"""
+Statements the endpoints run on their hot paths.
+
+Views build their queries here rather than inline so that
+``app.query_plans`` plans exactly what they execute.
+"""
+from app.models import db, Podcast, Progress, Queue, Subscription, User
+
+# Columns each in-progress entry nests per model
+IN_PROGRESS_FIELDS = (
+    ('progress', Progress, ('id', 'podcast_id', 'progress', 'version')),
+    ('podcast', Podcast, ('id', 'title', 'author_name', 'image_url', 'url')),
+    ('subscription', Subscription, ('id', 'title', 'image_url')),
+)
+
+
+def owned(model, user_id=None):
+    """Rows of ``model``, only ``user_id``'s when given."""
+    stmt = model.projection()
+    if user_id is not None:
+        stmt = stmt.where(model.user_id == user_id)
+    return stmt
+
+
+def owned_podcasts(user_id=None):
+    """Podcasts, only those of ``user_id``'s subscriptions when given."""
+    stmt = Podcast.projection()
+    if user_id is not None:
+        stmt = (stmt.join(Subscription, Podcast.subscription_id == Subscription.id)
+                .where(Subscription.user_id == user_id))
+    return stmt
+
+
+def podcast_owner(podcast_id):
+    """The ID of the user whose subscription a podcast belongs to."""
+    return (db.select(Subscription.user_id)
+            .join_from(Podcast, Subscription, Podcast.subscription_id == Subscription.id)
+            .where(Podcast.id == podcast_id))
+
+
+def user_progress(user_id, podcast_id):
+    return Progress.projection().where(Progress.user_id == user_id,
+                                       Progress.podcast_id == podcast_id)
+
+
+def in_progress(user_id, limit):
+    """Started, unfinished episodes with their podcast and subscription, latest first."""
+    columns = [getattr(model, name).label(f'{part}.{name}')
+               for part, model, names in IN_PROGRESS_FIELDS for name in names]
+    return (db.select(*columns)
+            .join_from(Progress, Podcast, Progress.podcast_id == Podcast.id)
+            .join(Subscription, Podcast.subscription_id == Subscription.id)
+            .where(Progress.user_id == user_id, Progress.progress > 0, Progress.progress < 100)
+            .order_by(Progress.version.desc(), Progress.id.desc())
+            .limit(limit))
+
+
+def user_queue(user_id):
+    """A user's queue in play order."""
+    return Queue.projection().where(Queue.user_id == user_id).order_by(Queue.position)
+
+
+def queue_position(user_id, queue_id):
+    return db.select(Queue.position).where(Queue.id == queue_id, Queue.user_id == user_id)
+
+
+def queue_neighbour(user_id, after=None, before=None):
+    """
+    The first position after ``after``, or the last one before ``before``
+    (the last of the queue with neither), in a user's queue.
+    """
+    stmt = db.select(Queue.position).where(Queue.user_id == user_id)
+    if after is not None:
+        return stmt.where(Queue.position > after).order_by(Queue.position).limit(1)
+    if before is not None:
+        stmt = stmt.where(Queue.position < before)
+    return stmt.order_by(Queue.position.desc()).limit(1)
+
+
+def login_user(email):
+    return db.select(User.id, User.password, User.salt).where(User.email == email)
@@ -0,0 +1,101 @@
+import datetime
+
+from sqlalchemy import create_engine, text
+
+from app import queries
+from app.feeds import due_feeds
+from app.models import db, Podcast, Progress, Queue, Subscription, User
+from app.pagination import after_id
+from app.search import ranked_matches
+from app.versioning import changed_rows, counter, deleted_rows
+
+
+def hot_queries():
+    """
+    The lookups the API runs on every request, keyed by a short name.
+
+    Each comes from the builder its endpoint calls, so a change there is
+    planned here too.
+    """
+    users = [1, 2, 3]
+    return {
+        'progress by user and podcast': queries.user_progress(1, 1),
+        'progress by user': queries.owned(Progress, 1),
+        # Foreign-key lookups the ORM relationships and cascades run
+        'progress by podcast': Progress.projection().where(Progress.podcast_id == 1),
+        'podcasts by user': queries.owned_podcasts(1),
+        'podcast owner': queries.podcast_owner(1),
+        'podcasts by subscription': Podcast.projection().where(Podcast.subscription_id == 1),
+        'due feeds': due_feeds(datetime.datetime(2000, 1, 1)),
+        'in progress': queries.in_progress(1, 100),
+        'queue by user': queries.user_queue(1),
+        'queue next': queries.user_queue(1).limit(1),
+        'queue position': queries.queue_position(1, 1),
+        'queue slot after': queries.queue_neighbour(1, after='a0'),
+        'queue slot before': queries.queue_neighbour(1, before='a0'),
+        'queue end': queries.queue_neighbour(1),
+        'subscriptions by user': queries.owned(Subscription, 1),
+        'user by email': queries.login_user('a@example.com'),
+        'user by id': User.projection().where(User.id == 1),
+        'user page': after_id(User.projection(), User.id, 1, 100),
+        'progress page': after_id(queries.owned(Progress), Progress.id, 1, 100),
+        'progress page for user': after_id(queries.owned(Progress, 1), Progress.id, 1, 100),
+        'queue page for user': after_id(queries.owned(Queue, 1), Queue.id, 1, 100),
+        'subscription page for user': after_id(queries.owned(Subscription, 1), Subscription.id, 1, 100),
+        'podcast page': after_id(Podcast.projection(), Podcast.id, 1, 100),
+        # A user's podcast page is left out: their episodes span subscriptions,
+        # so no index gives them in ID order and the page sorts them
+        'progress changes': changed_rows(Progress, 1, 2)
+            .order_by(Progress.version, Progress.id),
+        'progress changes for user': changed_rows(Progress, 1, 2, [1])
+            .order_by(Progress.version, Progress.id),
+        'progress changes for streamed users': changed_rows(Progress, 1, 2, users),
+        'queue changes for streamed users': changed_rows(Queue, 1, 2, users),
+        'subscription changes': changed_rows(Subscription, 1, 2),
+        'tombstones': deleted_rows(Progress, 1, 2),
+        'tombstones for streamed users': deleted_rows(Progress, 1, 2, users),
+        'search podcasts': ranked_matches('podcast', '"news"*', 21),
+        'search subscriptions': ranked_matches('subscription', '"news"*', 21),
+        'search podcasts for user': ranked_matches('podcast', '"news"*', 21, 1),
+        'search subscriptions for user': ranked_matches('subscription', '"news"*', 21, 1),
+        'table version': counter('progress'),
+    }
+
+
+def explain(connection, stmt):
+    """``EXPLAIN QUERY PLAN`` detail lines for a select, with its parameters inlined."""
+    sql = stmt.compile(connection, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+
+def slow_steps(plan):
+    """
+    Plan steps that walk a whole table or index instead of searching it, or
+    that sort rows in a temporary B-tree because no index gives their order.
+
+    Virtual tables always report a SCAN, as do subquery results; the FTS index
+    does its own lookup and subqueries are planned (and checked) themselves.
+    """
+    derived = {step.split()[1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    return [step for step in plan
+            if step.startswith('USE TEMP B-TREE')
+            or step.startswith('SCAN ') and 'VIRTUAL TABLE' not in step
+            and step.split()[1] not in derived]
+
+
+def check_query_plans(engine=None):
+    """
+    Plan every hot query against a schema built from the models.
+
+    Returns ``{name: (plan, slow)}``; any non-empty ``slow`` means that query
+    would read the whole table or sort its rows.
+    """
+    if engine is None:
+        engine = create_engine('sqlite://')
+        db.metadata.create_all(engine)
+    results = {}
+    with engine.connect() as connection:
+        for name, stmt in hot_queries().items():
+            plan = explain(connection, stmt)
+            results[name] = (plan, slow_steps(plan))
+    return results
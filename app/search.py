@@ -0,0 +1,159 @@
+import re
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import DDL, event, literal_column, table as sql_table
+
+from app.models import db, Podcast, Subscription
+
+# Each searchable model gets an external-content FTS5 table over its text
+# columns: the index stores only tokens and reads the text back from the model
+# table, and triggers keep it in step with every write, including the bulk
+# Core inserts done by feed refreshes and OPML imports. Alembic batch
+# migrations rebuild tables and drop their triggers, so a migration that
+# batch-alters one of these tables has to recreate them.
+SEARCHABLE = {
+    'podcast': (Podcast, ('title', 'author_name')),
+    'subscription': (Subscription, ('title', 'description')),
+}
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# bm25 column weights: title hits count ten times a secondary-column hit
+RANK_FUNCTION = 'bm25(10.0, 1.0)'
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def _trigger_ddl(table, columns):
+    fts = fts_table(table)
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    insert = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});'
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    return [
+        f'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {cols} ON {table} '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+
+def search_ddl(table, columns):
+    """The ``CREATE`` statements for ``table``'s FTS index and its sync triggers."""
+    fts = fts_table(table)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({', '.join(columns)}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ] + _trigger_ddl(table, columns)
+
+
+for _table, (_model, _columns) in SEARCHABLE.items():
+    for _statement in search_ddl(_table, _columns):
+        event.listen(_model.__table__, 'after_create',
+                     DDL(_statement).execute_if(dialect='sqlite'))
+
+
+@contextmanager
+def deferred_indexing(connection, table):
+    """
+    Suspend ``table``'s sync triggers and rebuild its FTS index once at the end.
+
+    For bulk loads: indexing row by row from the triggers costs several times
+    more than a single rebuild. Run it inside the loading transaction.
+    """
+    if table not in SEARCHABLE or connection.dialect.name != 'sqlite':
+        yield
+        return
+    for event_name in ('insert', 'delete', 'update'):
+        connection.exec_driver_sql(f'DROP TRIGGER {table}_fts_{event_name}')
+    yield
+    fts = fts_table(table)
+    connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    for statement in _trigger_ddl(table, SEARCHABLE[table][1]):
+        connection.exec_driver_sql(statement)
+
+
+def include_name(name, type_, parent_names):
+    """Alembic filter hiding the FTS tables (and their shadow tables) from autogenerate."""
+    if type_ == 'table':
+        return not any(name == fts_table(t) or name.startswith(fts_table(t) + '_')
+                       for t in SEARCHABLE)
+    return True
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    matched literally instead of raising syntax errors. Returns ``None`` when
+    the input has no searchable words.
+    """
+    words = _TOKEN.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def ranked_matches(table, expression, depth, user_id=None):
+    """
+    A select of ``(id, rank)`` for ``table``'s best ``depth`` matches, best first.
+
+    ``rank`` is the FTS5 bm25 score, lower is better, with title hits weighted
+    above the secondary column. The index ranks all of its matches itself
+    (``ORDER BY rank LIMIT depth``), so no temporary sort is needed. With a
+    ``user_id``, only rows under that user's subscriptions match, and the
+    limit counts only those.
+    """
+    fts = fts_table(table)
+    index = literal_column(fts)
+    row_id = literal_column(f'{fts}.rowid')
+    rank = literal_column(f'{fts}.rank')
+    stmt = (db.select(row_id.label('id'), rank.label('rank'))
+            .select_from(sql_table(fts))
+            .where(index.op('MATCH')(expression), rank.op('MATCH')(RANK_FUNCTION)))
+    if user_id is not None:
+        if table == 'podcast':
+            stmt = (stmt.join(Podcast, Podcast.id == row_id)
+                    .join(Subscription, Subscription.id == Podcast.subscription_id))
+        else:
+            stmt = stmt.join(Subscription, Subscription.id == row_id)
+        stmt = stmt.where(Subscription.user_id == user_id)
+    return stmt.order_by(rank).limit(depth)
+
+
+def search(query, offset, limit, user_id=None):
+    """
+    One page of search results as ``(items, next_offset)``, limited to
+    ``user_id``'s subscriptions and their episodes when given.
+
+    Each FTS index returns its best matches down to the end of the page, and
+    the few rows that come back are merged by rank here; the matching rows
+    are then loaded with one primary-key lookup per table. Results stop
+    SEARCH_MAX_CANDIDATES deep, which bounds how much each index sorts.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], None
+    depth = min(offset + limit + 1, current_app.config['SEARCH_MAX_CANDIDATES'])
+    if offset >= depth:
+        return [], None
+    hits = sorted((hit.rank, table, hit.id) for table in SEARCHABLE
+                  for hit in db.session.execute(ranked_matches(table, expression, depth, user_id)))
+    hits = hits[offset:depth]
+    next_offset = offset + limit if len(hits) > limit else None
+    hits = hits[:limit]
+
+    rows = {}
+    for table, (model, _) in SEARCHABLE.items():
+        ids = [row_id for _, hit_table, row_id in hits if hit_table == table]
+        if ids:
+            for row in db.session.execute(model.projection().where(model.id.in_(ids))):
+                rows[table, row.id] = model.row_dict(row)
+    items = [dict(rows[table, row_id], type=table, rank=rank)
+             for rank, table, row_id in hits if (table, row_id) in rows]
+    return items, next_offset
@@ -0,0 +1,146 @@
+import datetime
+import random
+import time
+from itertools import count, islice
+
+from sqlalchemy import insert
+
+from app.auth import hash_password
+from app.models import ChangeCounter, Podcast, Progress, Queue, Subscription, User
+from app.ordering import key_between
+from app.search import deferred_indexing
+from app.versioning import SYNC_COUNTER
+
+# Titles are drawn from this list so search benchmarks have known hits
+VOCABULARY = ('news', 'science', 'history', 'comedy', 'sports', 'music', 'tech', 'health',
+              'business', 'politics', 'travel', 'food', 'culture', 'crime', 'gaming', 'film')
+LANGUAGES = ('en', 'en', 'en', 'de', 'es', 'fr', 'pt', 'ja')
+
+CHUNK_SIZE = 20000
+# Every seeded user can log in with this password
+PASSWORD = 'password'
+EPOCH = datetime.datetime(2023, 1, 1)
+
+
+def _rng(seed, table):
+    # One stream per table, so changing one table's size leaves the others alone
+    return random.Random(f'{seed}:{table}')
+
+
+def _title(rng, kind, number):
+    return f'{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY)} {kind} {number}'
+
+
+def _users(seed, users):
+    # Hashed once and shared: a hash per user would take hours at this scale
+    password, salt = hash_password(PASSWORD, salt=f'seed{seed}')
+    for i in range(1, users + 1):
+        yield {'id': i, 'name': f'user{i}', 'email': f'user{i}@example.com',
+               'password': password, 'salt': salt}
+
+
+def _subscriptions(seed, users, per_user, versions):
+    rng = _rng(seed, 'subscription')
+    for i in range(1, users * per_user + 1):
+        subscribed_on = EPOCH + datetime.timedelta(seconds=rng.randrange(365 * 86400))
+        yield {'id': i, 'user_id': (i - 1) // per_user + 1, 'title': _title(rng, 'show', i),
+               'description': ' '.join(rng.choices(VOCABULARY, k=12)),
+               'language': rng.choice(LANGUAGES),
+               'pubDate': subscribed_on.strftime('%a, %d %b %Y %H:%M:%S +0000'),
+               'subscribed_on': subscribed_on, 'image_url': f'https://img.example.com/s{i}.jpg',
+               'url': f'https://feeds.example.com/{i}.xml', 'version': next(versions)}
+
+
+def _podcasts(seed, subscriptions, per_subscription):
+    rng = _rng(seed, 'podcast')
+    for i in range(1, subscriptions * per_subscription + 1):
+        yield {'id': i, 'subscription_id': (i - 1) // per_subscription + 1,
+               'title': _title(rng, 'episode', i), 'author_name': f'host{rng.randrange(1000)}',
+               'image_url': None, 'url': f'https://media.example.com/{i}.mp3'}
+
+
+def _episodes(rng, users, per_user, owned):
+    """Up to ``per_user`` distinct podcast IDs per user, from the user's own subscriptions."""
+    for user_id in range(1, users + 1):
+        first = (user_id - 1) * owned + 1
+        yield user_id, rng.sample(range(first, first + owned), min(per_user, owned))
+
+
+def _progress(seed, users, per_user, owned, versions):
+    rng = _rng(seed, 'progress')
+    for user_id, episodes in _episodes(rng, users, per_user, owned):
+        for podcast_id in episodes:
+            # About half finished, the rest somewhere in the middle or barely started
+            roll = rng.random()
+            progress = 100 if roll < 0.5 else rng.randrange(1, 100) if roll < 0.9 else 0
+            yield {'user_id': user_id, 'podcast_id': podcast_id, 'progress': progress,
+                   'version': next(versions)}
+
+
+def _queue(seed, users, per_user, owned, versions):
+    rng = _rng(seed, 'queue')
+    positions = []
+    position = None
+    for _ in range(min(per_user, owned)):
+        position = key_between(position, None)
+        positions.append(position)
+    for user_id, episodes in _episodes(rng, users, per_user, owned):
+        for podcast_id, position in zip(episodes, positions):
+            yield {'user_id': user_id, 'podcast_id': podcast_id, 'position': position,
+                   'version': next(versions)}
+
+
+def _insert(connection, model, rows, chunk_size):
+    """executemany ``rows`` in chunks, so huge tables never sit in memory at once."""
+    stmt = insert(model)
+    inserted = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return inserted
+        connection.execute(stmt, chunk)
+        inserted += len(chunk)
+
+
+def seed(engine, users, subscriptions, podcasts, progress, queue=0, seed=0,
+         chunk_size=CHUNK_SIZE, echo=None):
+    """
+    Fill an empty database with consistent synthetic data; returns row counts per table.
+
+    ``subscriptions`` is per user, ``podcasts`` per subscription, ``progress``
+    and ``queue`` per user, drawn from the episodes of the user's own
+    subscriptions. The same arguments always produce the same rows, and IDs
+    are dense from 1. Users log in as ``user<id>@example.com`` with PASSWORD.
+
+    Each table is written in one transaction with Core executemany, and its
+    search index is rebuilt once at the end rather than row by row. Versioned
+    rows get increasing versions and the change counters are set past them,
+    so later writes and delta syncs carry on normally. ``echo`` is called
+    with a message after each table.
+    """
+    versions = count(1)
+    subscription_count = users * subscriptions
+    owned = subscriptions * podcasts
+    tables = (
+        (User, _users(seed, users)),
+        (Subscription, _subscriptions(seed, users, subscriptions, versions)),
+        (Podcast, _podcasts(seed, subscription_count, podcasts)),
+        (Progress, _progress(seed, users, progress, owned, versions)),
+        (Queue, _queue(seed, users, queue, owned, versions)),
+    )
+    counts = {}
+    for model, rows in tables:
+        start = time.perf_counter()
+        with engine.begin() as connection, deferred_indexing(connection, model.__tablename__):
+            counts[model.__tablename__] = _insert(connection, model, rows, chunk_size)
+        if echo is not None:
+            echo(f'{model.__tablename__}: {counts[model.__tablename__]} rows '
+                 f'in {time.perf_counter() - start:.1f}s')
+
+    now = datetime.datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(ChangeCounter), [
+            {'name': name, 'value': next(versions) - 1 if name == SYNC_COUNTER else 1,
+             'updated_at': now}
+            for name in (SYNC_COUNTER,) + tuple(counts)])
+    return counts
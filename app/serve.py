@@ -0,0 +1,177 @@
+"""
+Production server: a pre-forking master with thread-pooled WSGI workers.
+
+    python -m app.serve --bind 0.0.0.0:8000 --processes 4 --threads 8
+
+The master builds the app once (so workers share its imported code), binds
+the listening socket and forks ``--processes`` workers that accept on it,
+replacing any that die. Each worker handles connections on a pool of
+``--threads`` threads; size it to the database pool (DB_POOL_SIZE plus
+DB_MAX_OVERFLOW). Server-sent event streams, which stay open but hold no
+database connection, get ``--stream-threads`` more, and a worker refuses
+streams beyond that so they never take the request threads. Database
+connections are never shared across processes: the engine drops its
+inherited pool in every forked child.
+
+SIGTERM or SIGINT shuts down gracefully: workers end their event streams
+(clients reconnect to another server), stop accepting, finish the requests
+in flight (up to ``--graceful-timeout`` seconds), flush buffered
+progress and exit, then the master exits. Only worker 0 runs the background
+feed refresher, when FEED_REFRESH_INTERVAL is set.
+"""
+import argparse
+import atexit
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from app.main import create_app, event_hub, feed_refresher
+
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections give their pool thread back after this
+    timeout = 5
+    access_log = False
+
+    def log_request(self, *args, **kwargs):
+        if self.access_log:
+            super().log_request(*args, **kwargs)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's WSGI server, handling connections on a fixed-size thread pool."""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads, fd):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self, timeout):
+        """Stop accepting and wait up to ``timeout`` seconds for in-flight requests."""
+        self.shutdown()
+        drained = threading.Thread(target=self.pool.shutdown, daemon=True)
+        drained.start()
+        drained.join(timeout)
+        return not drained.is_alive()
+
+
+def run_worker(app, listener, index, args):
+    """Serve until SIGTERM/SIGINT, then drain; returns the exit status."""
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    host, port = listener.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, args.threads + args.stream_threads,
+                              listener.fileno())
+    threading.Thread(target=server.serve_forever, name='accept', daemon=True).start()
+    if index == 0:
+        with app.app_context():
+            feed_refresher.start()
+
+    while not stopping.wait(1):
+        pass
+    with app.app_context():
+        feed_refresher.stop()
+        event_hub.close()
+    if not server.drain(args.graceful_timeout):
+        app.logger.warning('Worker %d: requests still running after %ss, exiting anyway',
+                           os.getpid(), args.graceful_timeout)
+        return 1
+    return 0
+
+
+def spawn(app, listener, index, args):
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 1
+    try:
+        status = run_worker(app, listener, index, args)
+    except BaseException:
+        app.logger.exception('Worker %d crashed', os.getpid())
+    finally:
+        # Never return into the master's loop; run exit hooks (progress flush) first
+        atexit._run_exitfuncs()
+        os._exit(status)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-forking production server.')
+    parser.add_argument('--bind', default='127.0.0.1:8000', help='host:port')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8, help='per process')
+    parser.add_argument('--stream-threads', type=int, default=64,
+                        help='per process, for event streams')
+    parser.add_argument('--graceful-timeout', type=float, default=30)
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args(argv)
+
+    RequestHandler.access_log = args.access_log
+    app = create_app({'EVENTS_MAX_STREAMS': args.stream_threads})
+    host, _, port = args.bind.rpartition(':')
+    listener = socket.create_server((host or '0.0.0.0', int(port)), backlog=1024)
+    listener.set_inheritable(True)
+    app.logger.warning('Serving on %s with %d processes x %d threads (+%d for streams)',
+                       args.bind, args.processes, args.threads, args.stream_threads)
+
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    workers = {spawn(app, listener, index, args): index for index in range(args.processes)}
+    while not stopping.is_set():
+        time.sleep(0.5)
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            index = workers.pop(pid, None)
+            if index is not None and not stopping.is_set():
+                app.logger.warning('Worker %d exited with status %d, restarting',
+                                   pid, os.waitstatus_to_exitcode(status))
+                workers[spawn(app, listener, index, args)] = index
+
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + args.graceful_timeout + 5
+    while workers and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        os.kill(pid, signal.SIGKILL)
+    listener.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
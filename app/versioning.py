@@ -0,0 +1,116 @@
+import datetime
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import db, ChangeCounter, Progress, Queue, Subscription, Tombstone
+
+# Rows of these models carry a change version and leave a tombstone when deleted
+VERSIONED_MODELS = (Progress, Queue, Subscription)
+
+# Bookkeeping tables that must not bump counters themselves
+UNTRACKED_TABLES = (ChangeCounter.__tablename__, Tombstone.__tablename__)
+
+SYNC_COUNTER = 'sync'
+
+
+def bump_counters(session, names):
+    """
+    Increment the named counters in one statement; returns ``{name: value}``.
+
+    Besides the global sync counter there is one counter per table, bumped on
+    every write to it, which conditional GETs use as a cheap table version.
+    The increment runs inside the caller's transaction, and SQLite's single
+    writer keeps each sequence monotonic across threads and processes.
+    """
+    now = datetime.datetime.utcnow()
+    stmt = sqlite_insert(ChangeCounter).values(
+        [{'name': name, 'value': 1, 'updated_at': now} for name in names])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChangeCounter.name],
+        set_={'value': ChangeCounter.value + 1, 'updated_at': stmt.excluded.updated_at},
+    ).returning(ChangeCounter.name, ChangeCounter.value)
+    return dict(session.connection().execute(stmt).all())
+
+
+def next_version(session, *tables):
+    """
+    Bump the sync counter (and the given table counters) and return the new version.
+
+    Every row written by one transaction gets the same version.
+    """
+    return bump_counters(session, (SYNC_COUNTER,) + tables)[SYNC_COUNTER]
+
+
+def counter(name):
+    return db.select(ChangeCounter.value, ChangeCounter.updated_at).where(ChangeCounter.name == name)
+
+
+def table_version(table):
+    """``(counter, last_modified)`` for a table; ``(0, None)`` if never written."""
+    row = db.session.execute(counter(table)).first()
+    return tuple(row) if row else (0, None)
+
+
+def current_version():
+    """The latest version handed out, without bumping it."""
+    value = db.session.scalar(
+        db.select(ChangeCounter.value).where(ChangeCounter.name == SYNC_COUNTER))
+    return value or 0
+
+
+def changed_rows(model, since, version, users=None):
+    """Rows of ``model`` written in ``(since, version]``, only ``users``' when given."""
+    stmt = model.projection().where(model.version > since, model.version <= version)
+    if users is not None:
+        stmt = stmt.where(model.user_id.in_(users))
+    return stmt
+
+
+def deleted_rows(model, since, version, users=None):
+    """``(user_id, row_id, version)`` of the ``model`` rows deleted in ``(since, version]``."""
+    stmt = db.select(Tombstone.user_id, Tombstone.row_id, Tombstone.version).where(
+        Tombstone.table_name == model.__tablename__,
+        Tombstone.version > since, Tombstone.version <= version)
+    if users is not None:
+        stmt = stmt.where(Tombstone.user_id.in_(users))
+    return stmt
+
+
+def changes_since(model, since, user_id=None):
+    """
+    Rows of ``model`` changed after version ``since`` plus the IDs deleted since.
+
+    Returns ``(rows, deleted_ids, version)`` where ``version`` is the high-water
+    mark the client should send as ``since`` next time.
+    """
+    version = current_version()
+
+    users = None if user_id is None else [user_id]
+    rows = db.session.execute(
+        changed_rows(model, since, version, users).order_by(model.version, model.id)).all()
+    tombstones = deleted_rows(model, since, version, users).order_by(Tombstone.version)
+    deleted = [row.row_id for row in db.session.execute(tombstones)]
+    return rows, deleted, version
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_versions(session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, VERSIONED_MODELS)]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, VERSIONED_MODELS)]
+
+    tables = {obj.__tablename__ for obj in session.new | session.deleted}
+    tables |= {obj.__tablename__ for obj in session.dirty if session.is_modified(obj)}
+    tables = sorted(tables.difference(UNTRACKED_TABLES))
+    if not tables:
+        return
+
+    version = next_version(session, *tables)
+    for obj in changed:
+        obj.version = version
+    for obj in deleted:
+        session.add(Tombstone(table_name=obj.__tablename__, row_id=obj.id,
+                              user_id=obj.user_id, version=version))
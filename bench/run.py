@@ -0,0 +1,302 @@
+"""
+Benchmark the API against a seeded database.
+
+    python -m bench.run --users 200 --requests 5000 --output bench-results.json
+    python -m bench.run --baseline bench-baseline.json
+
+A request mix (``bench/requests.jsonl`` by default, one request per line) is
+expanded into a deterministic list of requests, which is replayed in-process
+through the Flask test client and over HTTP against a local threaded WSGI
+server. Latency percentiles and throughput are reported per mix entry and
+written as JSON. With ``--baseline``, p95 latencies are compared to an earlier
+result file and the exit status is 1 if any regressed by more than
+``--threshold``.
+
+Mix lines have a ``name``, ``method``, ``path`` and ``weight`` and optionally
+a ``json`` or ``form`` body. ``{user_id}``, ``{subscription_id}``,
+``{podcast_id}``, ``{progress}`` and ``{word}`` are replaced with random
+values inside the seeded ranges; a recorded mix can simply use literal paths.
+An entry with ``"sample": "progress"`` takes its ``{user_id}`` and
+``{podcast_id}`` from one seeded progress row instead, so lookups of a
+user's progress on an episode find one.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from app.main import create_app, db
+from app.models import Progress
+from app.seed import VOCABULARY, seed
+
+DEFAULT_MIX = os.path.join(os.path.dirname(__file__), 'requests.jsonl')
+MODES = ('in-process', 'wsgi')
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+def load_mix(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def expand(template, values):
+    """Fill placeholders; a string that is exactly one placeholder keeps the value's type."""
+    if isinstance(template, str):
+        whole = PLACEHOLDER.fullmatch(template)
+        if whole:
+            return values[whole.group(1)]()
+        return PLACEHOLDER.sub(lambda m: str(values[m.group(1)]()), template)
+    if isinstance(template, list):
+        return [expand(item, values) for item in template]
+    if isinstance(template, dict):
+        return {key: expand(value, values) for key, value in template.items()}
+    return template
+
+
+def load_samples():
+    """Seeded key combinations an entry can ask for with ``sample``."""
+    pairs = db.session.execute(
+        db.select(Progress.user_id, Progress.podcast_id).order_by(Progress.id))
+    return {'progress': [row._asdict() for row in pairs]}
+
+
+def build_plan(mix, counts, total, rng, samples=None):
+    """``total`` concrete requests drawn from the weighted mix."""
+    values = {
+        'user_id': lambda: rng.randint(1, counts['user']),
+        'subscription_id': lambda: rng.randint(1, counts['subscription']),
+        'podcast_id': lambda: rng.randint(1, counts['podcast']),
+        'progress': lambda: rng.randrange(101),
+        'word': lambda: rng.choice(VOCABULARY),
+    }
+    entries = rng.choices(mix, weights=[entry.get('weight', 1) for entry in mix], k=total)
+    plan = []
+    for entry in entries:
+        entry_values = values
+        if 'sample' in entry:
+            row = rng.choice(samples[entry['sample']])
+            entry_values = dict(values, **{key: (lambda value=value: value)
+                                           for key, value in row.items()})
+        body = None
+        if 'json' in entry:
+            body = ('json', expand(entry['json'], entry_values))
+        elif 'form' in entry:
+            body = ('form', expand(entry['form'], entry_values))
+        plan.append((entry['name'], entry['method'], expand(entry['path'], entry_values), body))
+    return plan
+
+
+def _in_process_worker(app):
+    client = app.test_client()
+
+    def send(method, path, body):
+        kwargs = {}
+        if body is not None:
+            kwargs['json' if body[0] == 'json' else 'data'] = body[1]
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        return response.status_code
+
+    return send
+
+
+def _wsgi_worker(host, port):
+    state = {'connection': http.client.HTTPConnection(host, port)}
+
+    def send(method, path, body):
+        headers, payload = {}, None
+        if body is not None:
+            if body[0] == 'json':
+                headers['Content-Type'] = 'application/json'
+                payload = json.dumps(body[1])
+            else:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                payload = urlencode(body[1])
+        for attempt in (1, 2):
+            try:
+                state['connection'].request(method, path, payload, headers)
+                response = state['connection'].getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                state['connection'].close()
+                state['connection'] = http.client.HTTPConnection(host, port)
+                if attempt == 2:
+                    raise
+
+    return send
+
+
+def replay(plan, workers, make_send):
+    """Send ``plan`` from ``workers`` threads; returns samples and the wall time."""
+    samples = [[] for _ in range(workers)]
+
+    def work(index):
+        send = make_send()
+        for name, method, path, body in plan[index::workers]:
+            start = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except Exception:
+                status = 0
+            samples[index].append((name, status, time.perf_counter() - start))
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for worker in samples for sample in worker], time.perf_counter() - start
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(samples, wall_time):
+    def stats(group):
+        latencies = sorted(duration for _, _, duration in group)
+        statuses = {}
+        for _, status, _ in group:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'count': len(group),
+            'errors': sum(1 for _, status, _ in group if status == 0 or status >= 500),
+            'statuses': statuses,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'rps': round(len(group) / wall_time, 1),
+        }
+
+    routes = {}
+    for sample in samples:
+        routes.setdefault(sample[0], []).append(sample)
+    return {'total': stats(samples),
+            'routes': {name: stats(group) for name, group in sorted(routes.items())}}
+
+
+def run_mode(mode, app, plan, warmup, workers):
+    server = None
+    if mode == 'in-process':
+        make_send = lambda: _in_process_worker(app)
+    else:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class KeepAliveHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        make_send = lambda: _wsgi_worker('127.0.0.1', server.server_port)
+    try:
+        if warmup:
+            replay(plan[:warmup], workers, make_send)
+        samples, wall_time = replay(plan[warmup:], workers, make_send)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return summarize(samples, wall_time)
+
+
+def compare(result, baseline, threshold):
+    """Print p95 changes against ``baseline``; returns the regressions."""
+    regressions = []
+    for mode, current in result['modes'].items():
+        before = baseline.get('modes', {}).get(mode)
+        if before is None:
+            continue
+        for name, stats in current['routes'].items():
+            old = before['routes'].get(name)
+            if old is None or not old['p95_ms']:
+                continue
+            change = stats['p95_ms'] / old['p95_ms'] - 1
+            flag = 'REGRESSION' if change > threshold else ''
+            print(f'{mode:10} {name:24} p95 {old["p95_ms"]:9.3f} -> {stats["p95_ms"]:9.3f} ms '
+                  f'({change:+.0%}) {flag}')
+            if flag:
+                regressions.append((mode, name, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--subscriptions', type=int, default=5, help='per user')
+    parser.add_argument('--podcasts', type=int, default=20, help='per subscription')
+    parser.add_argument('--progress', type=int, default=50, help='per user')
+    parser.add_argument('--queue', type=int, default=10, help='per user')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=MODES + ('both',), default='both')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative p95 increase over the baseline')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='podcast-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "bench.sqlite")}'})
+
+    try:
+        with app.app_context():
+            db.create_all()
+            counts = seed(db.engine, args.users, args.subscriptions, args.podcasts,
+                          args.progress, args.queue, seed=args.seed)
+            samples = load_samples()
+
+        plan = build_plan(load_mix(args.mix), counts, args.warmup + args.requests,
+                          random.Random(args.seed), samples)
+        result = {
+            'meta': {'counts': counts, 'requests': args.requests, 'warmup': args.warmup,
+                     'workers': args.workers, 'seed': args.seed,
+                     'mix': os.path.basename(args.mix), 'python': platform.python_version(),
+                     'sqlite': sqlite3.sqlite_version},
+            'modes': {},
+        }
+        for mode in (MODES if args.mode == 'both' else (args.mode,)):
+            result['modes'][mode] = run_mode(mode, app, plan, args.warmup, args.workers)
+            total = result['modes'][mode]['total']
+            print(f'{mode:10} {total["rps"]:8.1f} req/s  p50 {total["p50_ms"]:.3f}  '
+                  f'p95 {total["p95_ms"]:.3f}  p99 {total["p99_ms"]:.3f} ms  '
+                  f'errors {total["errors"]}')
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    print(f'Wrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""unique progress per user and podcast
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 04:05:12.318204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Progress used to be inserted without a uniqueness check; keep the
+    # newest row of each (user_id, podcast_id) pair so the index can be built
+    op.execute('DELETE FROM progress WHERE id NOT IN '
+               '(SELECT MAX(id) FROM progress GROUP BY user_id, podcast_id)')
+    with op.batch_alter_table('progress', schema=None) as batch_op:
+        batch_op.create_index('ix_progress_user_id_podcast_id', ['user_id', 'podcast_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('progress', schema=None) as batch_op:
+        batch_op.drop_index('ix_progress_user_id_podcast_id')
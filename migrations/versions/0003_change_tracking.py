@@ -0,0 +1,57 @@
+"""change versions, counters and tombstones
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 04:05:40.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('progress', 'queue', 'subscription')
+
+
+def upgrade():
+    op.create_table('change_counter',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_tombstone_table_name_version', ['table_name', 'version'], unique=False)
+
+    # Existing rows start at version 0, so a first delta sync returns them all
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False,
+                                          server_default='0'))
+            batch_op.create_index(batch_op.f(f'ix_{table}_version'), ['version'], unique=False)
+
+
+def downgrade():
+    for table in reversed(VERSIONED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_version'))
+            batch_op.drop_column('version')
+
+    with op.batch_alter_table('tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_tombstone_table_name_version')
+
+    op.drop_table('tombstone')
+    op.drop_table('change_counter')
@@ -0,0 +1,67 @@
+"""ordered queue
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 02:34:54.762451
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+def _nth_key(n):
+    # Fixed-width order keys ('c' + three base-62 digits), see app/ordering.py
+    digits = ''
+    for _ in range(3):
+        n, d = divmod(n, len(DIGITS))
+        digits = DIGITS[d] + digits
+    return 'c' + digits
+
+
+def upgrade():
+    with op.batch_alter_table('queue', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('podcast_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('position', sa.String(length=64), nullable=True))
+
+    # Each old row queued at most one podcast; keep those in id order per user
+    connection = op.get_bind()
+    connection.execute(sa.text('DELETE FROM queue WHERE podcasts IS NULL'))
+    counts = {}
+    rows = connection.execute(sa.text('SELECT id, user_id FROM queue ORDER BY user_id, id'))
+    for queue_id, user_id in rows.all():
+        n = counts[user_id] = counts.get(user_id, -1) + 1
+        connection.execute(
+            sa.text('UPDATE queue SET podcast_id = podcasts, position = :position WHERE id = :id'),
+            {'position': _nth_key(n), 'id': queue_id})
+
+    with op.batch_alter_table('queue', schema=None) as batch_op:
+        batch_op.alter_column('podcast_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('position', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_index('ix_queue_user_id')
+        batch_op.create_index('ix_queue_user_id_position', ['user_id', 'position'], unique=True)
+        batch_op.create_foreign_key('fk_queue_podcast_id_podcast', 'podcast', ['podcast_id'], ['id'])
+        batch_op.drop_column('podcasts')
+
+
+def downgrade():
+    with op.batch_alter_table('queue', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('podcasts', sa.INTEGER(), nullable=True))
+
+    op.execute('UPDATE queue SET podcasts = podcast_id')
+
+    with op.batch_alter_table('queue', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_queue_podcast_id_podcast', type_='foreignkey')
+        batch_op.drop_index('ix_queue_user_id_position')
+        batch_op.create_index('ix_queue_user_id', ['user_id'], unique=False)
+        batch_op.drop_column('position')
+        batch_op.drop_column('podcast_id')
@@ -0,0 +1,47 @@
+"""search index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 02:41:12.208317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Mirrors app.search.SEARCHABLE at the time of this revision
+SEARCHABLE = {
+    'podcast': ('title', 'author_name'),
+    'subscription': ('title', 'description'),
+}
+
+
+def upgrade():
+    for table, columns in SEARCHABLE.items():
+        fts = f'{table}_fts'
+        cols = ', '.join(columns)
+        new = ', '.join(f'new.{c}' for c in columns)
+        old = ', '.join(f'old.{c}' for c in columns)
+        insert = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});'
+        delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+        op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+                   f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+                   f"prefix='2 3')")
+        op.execute(f'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert} END')
+        op.execute(f'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete} END')
+        op.execute(f'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {cols} ON {table} '
+                   f'BEGIN {delete} {insert} END')
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    for table in SEARCHABLE:
+        for event in ('insert', 'delete', 'update'):
+            op.execute(f'DROP TRIGGER {table}_fts_{event}')
+        op.execute(f'DROP TABLE {table}_fts')
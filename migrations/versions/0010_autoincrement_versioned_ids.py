@@ -0,0 +1,58 @@
+"""autoincrement versioned ids
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 05:12:03.518204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('progress', 'queue', 'subscription')
+
+# Mirrors app.search for subscription; rebuilding the table drops its triggers
+SEARCH_COLUMNS = ('title', 'description')
+
+
+def _recreate_search_triggers():
+    fts = 'subscription_fts'
+    cols = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+    insert = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});'
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    op.execute(f'CREATE TRIGGER subscription_fts_insert AFTER INSERT ON subscription '
+               f'BEGIN {insert} END')
+    op.execute(f'CREATE TRIGGER subscription_fts_delete AFTER DELETE ON subscription '
+               f'BEGIN {delete} END')
+    op.execute(f'CREATE TRIGGER subscription_fts_update AFTER UPDATE OF {cols} ON subscription '
+               f'BEGIN {delete} {insert} END')
+
+
+def upgrade():
+    # Without AUTOINCREMENT SQLite hands the highest ID out again once its row
+    # is deleted, and delta sync would report a tombstoned ID as live
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        # Continue after every ID ever used, deleted ones included
+        op.execute(f"INSERT INTO sqlite_sequence(name, seq) SELECT '{table}', 0 "
+                   f"WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = '{table}')")
+        op.execute(f"UPDATE sqlite_sequence SET seq = MAX(seq, "
+                   f"(SELECT COALESCE(MAX(row_id), 0) FROM tombstone WHERE table_name = '{table}')) "
+                   f"WHERE name = '{table}'")
+    _recreate_search_triggers()
+
+
+def downgrade():
+    for table in reversed(VERSIONED_TABLES):
+        with op.batch_alter_table(table, schema=None, recreate='always'):
+            pass
+    _recreate_search_triggers()
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+
+from app.main import create_app, db
+from app.models import Podcast, Subscription, User
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds apps over their own SQLite files, with the schema created."""
+    apps = []
+
+    def make(config=None, name='app'):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / name}.sqlite',
+                          'SECRET_KEY': 'test', 'PASSWORD_HASH_ITERATIONS': 1000,
+                          **(config or {})})
+        with app.app_context():
+            db.create_all()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            app.extensions['event_hub'].shutdown()
+            app.extensions['progress_buffer'].shutdown()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def add_episode():
+    """
+    Adds user ``user_id`` with one subscription and one episode, both under
+    the same ID as the user.
+    """
+    def add(app, user_id=1, title='Episode', subscription_title='Show'):
+        with app.app_context():
+            db.session.add(User(id=user_id, name='u', email=f'{user_id}@example.com',
+                                password='x', salt='1$s'))
+            db.session.add(Subscription(id=user_id, user_id=user_id, title=subscription_title,
+                                        url=f'http://feed/{user_id}',
+                                        subscribed_on=datetime.datetime.utcnow()))
+            db.session.add(Podcast(id=user_id, subscription_id=user_id, title=title,
+                                   url=f'http://ep/{user_id}'))
+            db.session.commit()
+
+    return add
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,60 @@
+import logging
+
+from app.main import create_app, db
+
+
+def test_apps_keep_their_own_config(make_app, add_episode):
+    buffered = make_app({'PROGRESS_WRITE_BEHIND': True, 'SECRET_KEY': 'a'}, name='a')
+    direct = make_app({'PROGRESS_WRITE_BEHIND': False, 'SECRET_KEY': 'b'}, name='b')
+    add_episode(buffered)
+    add_episode(direct)
+
+    form = {'user_id': 1, 'podcast_id': 1, 'progress': 10}
+    assert buffered.test_client().post('/progress', data=form).status_code == 202
+    assert direct.test_client().post('/progress', data=form).status_code == 201
+
+    with buffered.app_context():
+        token = buffered.extensions['auth'].issue_token(1)
+    headers = {'Authorization': f'Bearer {token}'}
+    assert buffered.test_client().get('/users/1', headers=headers).status_code == 200
+    assert direct.test_client().get('/users/1', headers=headers).status_code == 401
+
+
+def test_config_from_environment(monkeypatch, tmp_path):
+    settings = tmp_path / 'settings.py'
+    settings.write_text("MAX_PAGE_SIZE = 50\nDEFAULT_PAGE_SIZE = 5\n")
+    monkeypatch.setenv('PODCAST_SYNC_SETTINGS', str(settings))
+    monkeypatch.setenv('FLASK_DEFAULT_PAGE_SIZE', '7')
+    monkeypatch.setenv('FLASK_PROGRESS_WRITE_BEHIND', 'true')
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/env.sqlite'})
+    assert app.config['MAX_PAGE_SIZE'] == 50
+    assert app.config['DEFAULT_PAGE_SIZE'] == 7
+    assert app.config['PROGRESS_WRITE_BEHIND'] is True
+
+
+def settings_logged(caplog):
+    return [r for r in caplog.records if r.getMessage().startswith('Database settings:')]
+
+
+def test_database_settings_logged_on_first_request(make_app, caplog):
+    caplog.set_level(logging.INFO)
+    app = make_app({'SQLITE_PRAGMAS': {'journal_mode': 'WAL', 'busy_timeout': 1234}})
+    assert not settings_logged(caplog)
+
+    client = app.test_client()
+    client.get('/users')
+    client.get('/users')
+    logged = settings_logged(caplog)
+    assert len(logged) == 1
+    assert logged[0].levelname == 'INFO'
+    assert "'journal_mode': 'wal'" in logged[0].getMessage()
+    assert "'busy_timeout': 1234" in logged[0].getMessage()
+
+
+def test_apps_share_one_commit_listener(make_app):
+    def commit_listeners(app):
+        with app.app_context():
+            return len(list(db.session().dispatch.after_commit))
+
+    assert commit_listeners(make_app(name='one')) == commit_listeners(make_app(name='two'))
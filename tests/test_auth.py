@@ -0,0 +1,147 @@
+import pytest
+
+from app.main import db
+from app.models import Progress, Queue
+
+OPML = b'<opml><body><outline type="rss" xmlUrl="http://new-feed"/></body></opml>'
+
+# Requests acting for user 2 or on user 2's rows, by route family
+PROGRESS = [
+    ('get', '/progress?user_id=2', {}),
+    ('get', '/progress?since=0&user_id=2', {}),
+    ('get', '/progress/2', {}),
+    ('post', '/progress', {'data': {'user_id': 2, 'podcast_id': 2, 'progress': 5}}),
+    ('post', '/progress/batch', {'json': {'user_id': 2, 'items': []}}),
+    ('put', '/progress/2/2', {'json': {'progress': 5}}),
+    ('delete', '/progress/2', {}),
+]
+QUEUE = [
+    ('get', '/queue?since=0&user_id=2', {}),
+    ('post', '/queue', {'json': {'user_id': 2, 'podcast_id': 2}}),
+    ('put', '/queue/2', {'json': {}}),
+    ('delete', '/queue/2', {}),
+]
+SUBSCRIPTIONS = [
+    ('get', '/subscriptions?user_id=2', {}),
+    ('get', '/subscriptions/2', {}),
+    ('post', '/subscriptions', {'json': {'user_id': 2, 'title': 't', 'url': 'u'}}),
+    ('put', '/subscriptions/2', {'data': {'title': 't'}}),
+    ('delete', '/subscriptions/2', {}),
+    ('post', '/subscriptions/import?user_id=2', {'data': OPML}),
+]
+PODCASTS = [
+    ('get', '/podcasts?user_id=2', {}),
+    ('get', '/podcasts/2', {}),
+    ('put', '/podcasts/2?title=t', {}),
+    ('delete', '/podcasts/2', {}),
+]
+ROUTES = PROGRESS + QUEUE + SUBSCRIPTIONS + PODCASTS
+
+
+@pytest.fixture
+def app(make_app, add_episode):
+    app = make_app({'AUTH_REQUIRED': True})
+    for user_id in (1, 2):
+        add_episode(app, user_id)
+    with app.app_context():
+        for user_id in (1, 2):
+            db.session.add(Progress(id=user_id, user_id=user_id, podcast_id=user_id,
+                                    progress=10))
+            db.session.add(Queue(id=user_id, user_id=user_id, podcast_id=user_id,
+                                 position='a0'))
+        db.session.commit()
+    return app
+
+
+def bearer(app, user_id):
+    with app.app_context():
+        return {'Authorization': f"Bearer {app.extensions['auth'].issue_token(user_id)}"}
+
+
+def send(client, method, path, kwargs, headers=None):
+    return getattr(client, method)(path, headers=headers, **kwargs)
+
+
+@pytest.mark.parametrize('method,path,kwargs', ROUTES)
+def test_token_required(client, method, path, kwargs):
+    assert send(client, method, path, kwargs).status_code == 401
+
+
+@pytest.mark.parametrize('method,path,kwargs', ROUTES)
+def test_other_users_token_forbidden(app, client, method, path, kwargs):
+    assert send(client, method, path, kwargs, bearer(app, 1)).status_code == 403
+
+
+@pytest.mark.parametrize('method,path,kwargs', ROUTES)
+def test_invalid_token_refused(client, method, path, kwargs):
+    headers = {'Authorization': 'Bearer forged'}
+    assert send(client, method, path, kwargs, headers).status_code == 401
+
+
+@pytest.mark.parametrize('path,owner', [('/progress', 'user_id'), ('/queue', 'user_id'),
+                                        ('/subscriptions', 'user_id'),
+                                        ('/podcasts', 'subscription_id'), ('/users', 'id')])
+def test_listings_are_scoped_to_the_token(app, client, path, owner):
+    for user_id in (1, 2):
+        response = client.get(path, headers=bearer(app, user_id))
+        assert response.status_code == 200
+        assert [row[owner] for row in response.json] == [user_id]
+        assert 'Authorization' in response.headers['Vary']
+
+    if path in ('/podcasts', '/users'):
+        return
+    delta = client.get(f'{path}?since=0', headers=bearer(app, 2))
+    assert [row['user_id'] for row in delta.json['items']] == [2]
+
+
+def test_token_user_is_the_default(app, client):
+    headers = bearer(app, 2)
+    created = client.post('/queue', json={'podcast_id': 1}, headers=headers)
+    assert created.status_code == 201
+    assert created.json['user_id'] == 2
+
+    batch = client.post('/progress/batch', json={'items': [{'podcast_id': 1, 'progress': 7}]},
+                        headers=headers)
+    assert batch.json['items'] == [{'podcast_id': 1, 'status': 'ok'}]
+    assert client.get('/progress/2/1', headers=headers).json['progress'] == 7
+
+    imported = client.post('/subscriptions/import', data=OPML, headers=headers)
+    assert imported.json == {'imported': 1, 'skipped': 0}
+
+
+def test_owner_may_change_their_rows(app, client):
+    headers = bearer(app, 2)
+    assert client.get('/progress/2', headers=headers).status_code == 200
+    assert client.get('/subscriptions/2', headers=headers).status_code == 200
+    assert client.put('/subscriptions/2', data={'title': 'New'}, headers=headers).status_code == 200
+    assert client.get('/podcasts/2', headers=headers).status_code == 200
+    assert client.put('/podcasts/2?title=New', headers=headers).status_code == 200
+    assert client.put('/queue/2', json={}, headers=headers).status_code == 200
+    assert client.delete('/queue/2', headers=headers).status_code == 204
+    assert client.delete('/progress/2', headers=headers).status_code == 204
+    assert client.delete('/subscriptions/2', headers=headers).status_code == 204
+
+
+def test_cached_subscription_not_served_to_another_user(app, client):
+    assert client.get('/subscriptions/2', headers=bearer(app, 2)).status_code == 200
+    assert client.get('/subscriptions/2', headers=bearer(app, 1)).status_code == 403
+
+
+def test_cached_podcast_not_served_to_another_user(app, client):
+    assert client.get('/podcasts/2', headers=bearer(app, 2)).status_code == 200
+    assert client.get('/podcasts/2', headers=bearer(app, 1)).status_code == 403
+
+
+def test_query_token_only_accepted_on_event_streams(app, client):
+    with app.app_context():
+        token = app.extensions['auth'].issue_token(2)
+    assert client.get(f'/progress?access_token={token}').status_code == 401
+    assert client.get(f'/users/2/queue?access_token={token}').status_code == 401
+
+    stream = client.get(f'/users/2/events?access_token={token}')
+    try:
+        assert stream.status_code == 200
+        assert stream.mimetype == 'text/event-stream'
+    finally:
+        stream.close()
+    assert client.get(f'/users/1/events?access_token={token}').status_code == 403
@@ -0,0 +1,32 @@
+import pytest
+
+from app.cache import shared_cache_settings
+
+
+def test_shared_cache_key_derived_per_deployment(make_app):
+    one = make_app({'SECRET_KEY': 'one'}, name='one').config['RESPONSE_CACHE_AUTHKEY']
+    two = make_app({'SECRET_KEY': 'two'}, name='two').config['RESPONSE_CACHE_AUTHKEY']
+    assert one and two and one != two
+    assert b'one' not in one
+
+
+def test_shared_cache_refuses_without_a_key(make_app):
+    app = make_app({'SECRET_KEY': None})
+    with pytest.raises(ValueError, match='RESPONSE_CACHE_AUTHKEY or SECRET_KEY'):
+        shared_cache_settings(app.config)
+
+
+@pytest.mark.parametrize('address', [('0.0.0.0', 50111), ['10.0.0.5', 50111],
+                                     ('example.com', 50111)])
+def test_shared_cache_refuses_public_addresses(address):
+    config = {'RESPONSE_CACHE_ADDRESS': address, 'RESPONSE_CACHE_AUTHKEY': b'k'}
+    with pytest.raises(ValueError, match='loopback'):
+        shared_cache_settings(config)
+
+
+@pytest.mark.parametrize('address', [('127.0.0.1', 50111), ['localhost', 50111],
+                                     ('::1', 50111), '/run/podcast-sync/cache.sock'])
+def test_shared_cache_allows_local_addresses(address):
+    config = {'RESPONSE_CACHE_ADDRESS': address, 'RESPONSE_CACHE_AUTHKEY': 'k'}
+    expected = address if isinstance(address, str) else tuple(address)
+    assert shared_cache_settings(config) == (expected, b'k')
@@ -0,0 +1,100 @@
+import datetime
+import gzip
+
+import pytest
+from werkzeug.http import http_date
+
+from app.main import db
+from app.models import ChangeCounter, Podcast
+from app.versioning import bump_counters
+
+
+@pytest.fixture
+def app(make_app, add_episode):
+    app = make_app({'COMPRESSION_MIN_SIZE': 0})
+    add_episode(app, title='Before')
+    with app.app_context():
+        bump_counters(db.session, ['podcast', 'subscription'])
+        db.session.commit()
+    set_updated_at(app, seconds_ago=2)
+    return app
+
+
+def set_updated_at(app, seconds_ago):
+    """Move the podcast and subscription counters' last write into the past."""
+    with app.app_context():
+        when = datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds_ago)
+        db.session.execute(db.update(ChangeCounter).values(updated_at=when))
+        db.session.commit()
+    return when
+
+
+def rename_elsewhere(app, title):
+    """A write made by another worker: the counter moves, this process's caches are untouched."""
+    with app.app_context():
+        db.session.execute(db.update(Podcast).where(Podcast.id == 1).values(title=title))
+        bump_counters(db.session, ['podcast'])
+        db.session.commit()
+
+
+@pytest.mark.parametrize('headers', [{}, {'Accept-Encoding': 'gzip'}])
+def test_write_then_revalidate(app, client, headers):
+    def get(extra=None):
+        response = client.get('/podcasts/1', headers={**headers, **(extra or {})})
+        if response.headers.get('Content-Encoding') == 'gzip':
+            response.set_data(gzip.decompress(response.get_data()))
+        return response
+
+    first = get()
+    assert first.json['title'] == 'Before'
+    assert get().json['title'] == 'Before'  # served from the caches
+
+    rename_elsewhere(app, 'After')
+    revalidated = get({'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 200
+    assert revalidated.json['title'] == 'After'
+    assert revalidated.headers['ETag'] != first.headers['ETag']
+
+    unchanged = get({'If-None-Match': revalidated.headers['ETag']})
+    assert unchanged.status_code == 304
+
+
+def test_not_modified_names_the_compressed_variant(client):
+    gzipped = client.get('/podcasts', headers={'Accept-Encoding': 'gzip'})
+    etag = gzipped.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    revalidated = client.get('/podcasts', headers={'Accept-Encoding': 'gzip',
+                                                   'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    assert 'Accept-Encoding' in revalidated.headers['Vary']
+
+    by_date = client.get('/podcasts', headers={
+        'Accept-Encoding': 'gzip', 'If-Modified-Since': gzipped.headers['Last-Modified']})
+    assert by_date.status_code == 304
+    assert by_date.headers['ETag'] == etag
+    assert 'Accept-Encoding' in by_date.headers['Vary']
+
+
+def test_date_of_a_write_in_the_current_second_is_not_trusted(app, client):
+    when = set_updated_at(app, seconds_ago=0)
+    response = client.get('/podcasts/1', headers={'If-Modified-Since': http_date(when)})
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+
+    # A later write in the same second must not be hidden behind that date
+    rename_elsewhere(app, 'Renamed')
+    set_updated_at(app, seconds_ago=0)
+    response = client.get('/podcasts/1', headers={'If-Modified-Since': http_date(when)})
+    assert response.status_code == 200
+    assert response.json['title'] == 'Renamed'
+
+
+def test_date_validates_once_its_second_has_passed(app, client):
+    when = set_updated_at(app, seconds_ago=2)
+    first = client.get('/podcasts/1')
+    assert first.headers['Last-Modified'] == http_date(when.replace(microsecond=0))
+    response = client.get('/podcasts/1',
+                          headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
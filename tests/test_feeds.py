@@ -0,0 +1,198 @@
+import datetime
+import pathlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import feeds
+from app.main import db, feed_refresher
+from app.models import Podcast, Subscription, User
+
+FEED = (pathlib.Path(__file__).parent / 'fixtures' / 'feed.rss').read_bytes()
+ETAG = '"v1"'
+# The test server listens on loopback, which feed fetches refuse by default
+LOCAL = {'FEED_ALLOW_PRIVATE_ADDRESSES': True}
+
+
+class FeedServer(ThreadingHTTPServer):
+    """Serves the fixture feed and records what the refresher asked for."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FeedHandler)
+        self.requests = []
+        self.lock = threading.Lock()
+        self.active = self.max_active = 0
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get('If-None-Match')))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.2)
+            if self.path.startswith('/redirect/'):
+                hops = int(self.path.rsplit('/', 1)[1])
+                target = f'/redirect/{hops - 1}' if hops > 1 else '/feed.rss'
+                self._send(302, location=self.headers.get('X-Target') or target)
+            elif self.path.startswith('/elsewhere/'):
+                self._send(302, location=self.path.split('/', 2)[2].replace('|', '/'))
+            elif self.path == '/broken.rss':
+                self._send(200, b'<rss><channel><item><title>Cut off')
+            elif self.headers.get('If-None-Match') == ETAG:
+                self._send(304)
+            else:
+                self._send(200, FEED)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, body=b'', location=None):
+        self.send_response(status)
+        if location:
+            self.send_header('Location', location)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FeedServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def subscribe(app, *urls):
+    with app.app_context():
+        db.session.add(User(id=1, name='u', email='u@example.com', password='x', salt='1$s'))
+        for url in urls:
+            db.session.add(Subscription(user_id=1, title=url, url=url,
+                                        subscribed_on=datetime.datetime.utcnow()))
+        db.session.commit()
+
+
+def refresh(app):
+    with app.app_context():
+        return feed_refresher.refresh(force=True)
+
+
+def test_stores_episodes_then_revalidates_with_etag(make_app, server):
+    app = make_app(LOCAL)
+    subscribe(app, server.url('/feed.rss'))
+
+    stats = refresh(app)
+    assert (stats['ok'], stats['episodes']) == (1, 2)
+    with app.app_context():
+        episodes = db.session.execute(
+            db.select(Podcast.title, Podcast.url, Podcast.author_name, Podcast.image_url)
+            .order_by(Podcast.title)).all()
+        assert db.session.scalar(db.select(Subscription.feed_etag)) == ETAG
+    assert episodes == [
+        ('Episode 1', 'http://example.com/1.mp3', 'Fixture Author', 'http://example.com/show.png'),
+        ('Episode 2', 'http://example.com/2', 'Guest', 'http://example.com/show.png'),
+    ]
+
+    stats = refresh(app)
+    assert (stats['not_modified'], stats['episodes']) == (1, 0)
+    assert server.requests == [('/feed.rss', None), ('/feed.rss', ETAG)]
+
+
+def test_timeout_is_an_error_and_backs_off(make_app, server):
+    app = make_app(dict(LOCAL, FEED_REFRESH_TIMEOUT=0.05))
+    subscribe(app, server.url('/slow.rss'))
+
+    stats = refresh(app)
+    assert (stats['error'], stats['episodes']) == (1, 0)
+    with app.app_context():
+        subscription = db.session.execute(db.select(Subscription)).scalar_one()
+        assert subscription.feed_backoff == 1
+        assert subscription.feed_etag is None
+        assert subscription.feed_next_check_at > datetime.datetime.utcnow()
+
+
+def test_malformed_feed_is_an_error(make_app, server):
+    app = make_app(LOCAL)
+    subscribe(app, server.url('/broken.rss'), server.url('/feed.rss'))
+
+    stats = refresh(app)
+    assert (stats['ok'], stats['error'], stats['episodes']) == (1, 1, 2)
+
+
+def test_per_host_limit(make_app, server):
+    app = make_app(dict(LOCAL, FEED_REFRESH_WORKERS=8, FEED_PER_HOST_LIMIT=2))
+    subscribe(app, *(server.url(f'/slow/{n}.rss') for n in range(6)))
+
+    stats = refresh(app)
+    assert stats['ok'] == 6
+    assert server.max_active == 2
+
+
+@pytest.mark.parametrize('address, public', [
+    ('93.184.216.34', True), ('2606:4700::1111', True), ('127.0.0.1', False),
+    ('10.1.2.3', False), ('172.16.0.1', False), ('192.168.1.1', False),
+    ('169.254.169.254', False), ('100.64.0.1', False), ('0.0.0.0', False), ('::1', False),
+    ('fe80::1%eth0', False), ('fd00::1', False), ('::ffff:127.0.0.1', False),
+    ('224.0.0.1', False)])
+def test_public_addresses(address, public):
+    assert feeds.is_public_address(address) is public
+
+
+def test_private_feed_hosts_refused(make_app, server):
+    app = make_app()
+    subscribe(app, server.url('/feed.rss'), f'http://localhost:{server.server_port}/feed.rss')
+
+    stats = refresh(app)
+    assert (stats['error'], stats['episodes']) == (2, 0)
+    assert server.requests == []
+
+
+def test_redirects_checked_again(make_app, server, monkeypatch):
+    checked = []
+
+    def only_first_host(address):
+        checked.append(address)
+        return address == '127.0.0.1'
+
+    monkeypatch.setattr(feeds, 'is_public_address', only_first_host)
+    app = make_app()
+    target = f'http:||127.0.0.2:{server.server_port}|feed.rss'
+    subscribe(app, server.url(f'/elsewhere/{target}'))
+
+    stats = refresh(app)
+    assert stats['error'] == 1
+    assert checked == ['127.0.0.1', '127.0.0.2']
+    assert [path for path, _ in server.requests] == [f'/elsewhere/{target}']
+
+
+@pytest.mark.parametrize('hops, status', [(2, 'ok'), (3, 'error')])
+def test_redirects_capped(make_app, server, hops, status):
+    app = make_app(dict(LOCAL, FEED_MAX_REDIRECTS=2))
+    subscribe(app, server.url(f'/redirect/{hops}'))
+
+    assert refresh(app)[status] == 1
+
+
+def test_redirect_to_other_schemes_refused(make_app, server):
+    app = make_app(LOCAL)
+    subscribe(app, server.url('/elsewhere/ftp:||127.0.0.1|feed.rss'))
+
+    assert refresh(app)['error'] == 1
@@ -0,0 +1,63 @@
+import pytest
+
+from app.ordering import SMALLEST_INTEGER, key_between
+
+
+def test_empty_list():
+    assert key_between(None, None) == 'a0'
+
+
+@pytest.mark.parametrize('a,expected', [('a0', 'a1'), ('az', 'b00'), ('Zz', 'a0')])
+def test_after_the_last(a, expected):
+    assert key_between(a, None) == expected
+
+
+def test_before_the_first():
+    assert key_between(None, 'a0') == 'Zz'
+    assert key_between(None, 'a0V') == 'a0'
+
+
+@pytest.mark.parametrize('a,b', [('a0', 'a1'), ('a0', 'a0V'), ('a0V', 'a1'), ('Zz', 'a0'),
+                                 ('a0', 'a00V'), ('a1', 'a1001')])
+def test_between_adjacent_keys(a, b):
+    key = key_between(a, b)
+    assert a < key < b
+
+
+def test_repeated_inserts_at_the_head():
+    keys = ['a0']
+    for _ in range(2000):
+        keys.insert(0, key_between(None, keys[0]))
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+    assert max(map(len, keys)) <= 4
+
+
+def test_repeated_inserts_after_the_same_key():
+    low, high = 'a0', 'a1'
+    keys = [low, high]
+    for _ in range(200):
+        high = key_between(low, high)
+        keys.append(high)
+    assert sorted(keys) == [low] + keys[:1:-1] + ['a1']
+
+
+def test_repeated_appends():
+    keys = [key_between(None, None)]
+    for _ in range(5000):
+        keys.append(key_between(keys[-1], None))
+    assert keys == sorted(keys)
+    assert max(map(len, keys)) <= 4
+
+
+@pytest.mark.parametrize('a,b', [('a1', 'a0'), ('a0', 'a0')])
+def test_out_of_order_bounds(a, b):
+    with pytest.raises(ValueError):
+        key_between(a, b)
+
+
+def test_nothing_before_the_smallest_key():
+    with pytest.raises(ValueError):
+        key_between(None, SMALLEST_INTEGER)
+    key = key_between(None, SMALLEST_INTEGER + 'V')
+    assert SMALLEST_INTEGER < key < SMALLEST_INTEGER + 'V'
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.mark.parametrize('path', ['/podcasts?after=abc', '/podcasts?limit=ten',
+                                  '/users?after=1.5', '/search?q=x&after=abc'])
+def test_non_integer_cursor_rejected(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'must be an integer' in response.json['message']
@@ -0,0 +1,82 @@
+import pytest
+
+from app.main import db
+from app.models import Progress
+
+
+@pytest.fixture(params=[False, True], ids=['direct', 'write-behind'])
+def app(make_app, add_episode, request):
+    app = make_app({'PROGRESS_WRITE_BEHIND': request.param})
+    add_episode(app)
+    return app
+
+
+@pytest.mark.parametrize('user_id,podcast_id', [(999, 1), (1, 999), (999, 999)])
+def test_update_unknown_user_or_podcast(app, client, user_id, podcast_id):
+    response = client.put(f'/progress/{user_id}/{podcast_id}', json={'progress': 5})
+    assert response.status_code == 404
+
+    with app.app_context():
+        app.extensions['progress_buffer'].flush()
+        assert db.session.scalar(db.select(db.func.count()).select_from(Progress)) == 0
+
+
+def test_update_known_user_and_podcast(app, client):
+    response = client.put('/progress/1/1', json={'progress': 5})
+    assert response.status_code in (200, 202)
+    assert client.get('/progress/1/1').json['progress'] == 5
+
+
+def test_booleans_are_not_integers(app, client):
+    assert client.put('/progress/1/1', json={'progress': True}).status_code == 400
+
+    batch = client.post('/progress/batch', json={'user_id': 1, 'items': [
+        {'podcast_id': 1, 'progress': True}, {'podcast_id': True, 'progress': 5}]})
+    assert [item['status'] for item in batch.json['items']] == ['invalid', 'invalid']
+    assert client.post('/progress/batch', json={'user_id': True, 'items': []}).status_code == 400
+    assert client.post('/queue', json={'user_id': 1, 'podcast_id': True}).status_code == 400
+
+    with app.app_context():
+        app.extensions['progress_buffer'].flush()
+        assert db.session.scalar(db.select(db.func.count()).select_from(Progress)) == 0
+
+
+@pytest.fixture
+def buffered(make_app, add_episode):
+    app = make_app({'PROGRESS_WRITE_BEHIND': True, 'PROGRESS_FLUSH_INTERVAL_MS': 60000})
+    add_episode(app)
+    return app
+
+
+def flush(app):
+    with app.app_context():
+        app.extensions['progress_buffer'].flush()
+
+
+def stored(app):
+    with app.app_context():
+        return db.session.execute(db.select(Progress.progress)).scalars().all()
+
+
+def test_delete_drops_the_buffered_position(buffered):
+    client = buffered.test_client()
+    client.put('/progress/1/1', json={'progress': 30})
+    flush(buffered)
+    progress_id = client.get('/progress/1/1').json['id']
+
+    assert client.put('/progress/1/1', json={'progress': 50}).status_code == 202
+    assert client.delete(f'/progress/{progress_id}').status_code == 204
+    flush(buffered)
+    assert stored(buffered) == []
+    assert client.get('/progress/1/1').status_code == 404
+
+
+def test_batch_overrides_the_buffered_position(buffered):
+    client = buffered.test_client()
+    assert client.put('/progress/1/1', json={'progress': 30}).status_code == 202
+    batch = client.post('/progress/batch', json={'user_id': 1,
+                                                 'items': [{'podcast_id': 1, 'progress': 90}]})
+    assert batch.json['items'] == [{'podcast_id': 1, 'status': 'ok'}]
+    flush(buffered)
+    assert stored(buffered) == [90]
+    assert client.get('/progress/1/1').json['progress'] == 90
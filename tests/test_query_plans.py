@@ -0,0 +1,16 @@
+import pytest
+
+from app.query_plans import check_query_plans, slow_steps
+
+
+def test_slow_steps_flag_scans_and_temporary_sorts():
+    assert slow_steps(['SCAN progress']) == ['SCAN progress']
+    assert slow_steps(['SEARCH progress USING INDEX ix (user_id=?)',
+                       'USE TEMP B-TREE FOR ORDER BY']) == ['USE TEMP B-TREE FOR ORDER BY']
+    assert slow_steps(['SCAN podcast_fts VIRTUAL TABLE INDEX 32:rM2']) == []
+
+
+@pytest.mark.parametrize('name, result', check_query_plans().items())
+def test_hot_query_uses_an_index(name, result):
+    plan, slow = result
+    assert not slow, f'{name}: {"; ".join(plan)}'
@@ -0,0 +1,81 @@
+import pytest
+
+from app.main import db
+from app.models import Podcast
+
+
+@pytest.fixture
+def app(make_app, add_episode):
+    app = make_app()
+    add_episode(app)
+    with app.app_context():
+        for podcast_id in (2, 3, 4):
+            db.session.add(Podcast(id=podcast_id, subscription_id=1, title=f'Episode {podcast_id}',
+                                   url=f'http://ep/{podcast_id}'))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def queued(client):
+    """Podcasts 1-3 queued in order; returns their queue entry IDs."""
+    return [client.post('/queue', json={'user_id': 1, 'podcast_id': podcast_id}).json['id']
+            for podcast_id in (1, 2, 3)]
+
+
+def order(client):
+    return [item['podcast_id'] for item in client.get('/users/1/queue').json]
+
+
+def test_insert_at_either_end_and_between(client, queued):
+    first, second, _ = queued
+    client.post('/queue', json={'user_id': 1, 'podcast_id': 4, 'before_id': first})
+    assert order(client) == [4, 1, 2, 3]
+    client.post('/queue', json={'user_id': 1, 'podcast_id': 4, 'after_id': first})
+    assert order(client) == [4, 1, 4, 2, 3]
+    client.post('/queue', json={'user_id': 1, 'podcast_id': 4, 'before_id': second})
+    assert order(client) == [4, 1, 4, 4, 2, 3]
+
+
+def test_move(client, queued):
+    first, second, third = queued
+    assert client.put(f'/queue/{third}', json={'before_id': first}).status_code == 200
+    assert order(client) == [3, 1, 2]
+    assert client.put(f'/queue/{third}', json={'after_id': first}).status_code == 200
+    assert order(client) == [1, 3, 2]
+    assert client.put(f'/queue/{first}', json={}).status_code == 200
+    assert order(client) == [3, 2, 1]
+
+
+def test_repeated_moves_to_the_head(client, queued):
+    for _ in range(50):
+        for entry in queued:
+            head = client.get('/users/1/queue').json[0]['id']
+            if head != entry:
+                assert client.put(f'/queue/{entry}', json={'before_id': head}).status_code == 200
+    assert order(client) == [3, 2, 1]
+
+
+@pytest.mark.parametrize('body', [{'after_id': 'abc'}, {'before_id': 1.5},
+                                  {'after_id': True}, {'after_id': 1, 'before_id': 2}])
+def test_invalid_neighbour_is_bad_request(client, queued, body):
+    assert client.put(f'/queue/{queued[0]}', json=body).status_code == 400
+    assert client.post('/queue', json={'user_id': 1, 'podcast_id': 4, **body}).status_code == 400
+    assert order(client) == [1, 2, 3]
+
+
+def test_move_relative_to_itself(client, queued):
+    assert client.put(f'/queue/{queued[0]}', json={'after_id': queued[0]}).status_code == 400
+
+
+def test_unknown_neighbour_or_entry(client, queued):
+    assert client.put(f'/queue/{queued[0]}', json={'after_id': 999}).status_code == 404
+    assert client.put('/queue/999', json={}).status_code == 404
+    response = client.post('/queue', json={'user_id': 1, 'podcast_id': 4, 'after_id': 999})
+    assert response.status_code == 404
+
+
+def test_unknown_user_or_podcast(client):
+    assert client.post('/queue', json={'user_id': 999, 'podcast_id': 1}).status_code == 404
+    assert client.post('/queue', json={'user_id': 1, 'podcast_id': 999}).status_code == 404
+    assert order(client) == []
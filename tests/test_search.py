@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+from app.main import db
+from app.models import Subscription
+
+
+@pytest.fixture
+def add_catalog(add_episode):
+    """One old strong match (a title hit) followed by newer weak ones."""
+    def add(app):
+        add_episode(app, title='Morning news', subscription_title='News Daily')
+        now = datetime.datetime.utcnow()
+        with app.app_context():
+            for n in range(2, 12):
+                db.session.add(Subscription(id=n, user_id=1, title=f'Show {n}',
+                                            url=f'http://feed/{n}',
+                                            description='talk and some news', subscribed_on=now))
+            db.session.commit()
+
+    return add
+
+
+def test_best_match_survives_the_candidate_cap(make_app, add_catalog):
+    app = make_app({'SEARCH_MAX_CANDIDATES': 5})
+    add_catalog(app)
+
+    items = app.test_client().get('/search?q=news&limit=3').get_json()['items']
+    assert [(item['type'], item['id']) for item in items][:2] == [
+        ('subscription', 1), ('podcast', 1)]
+
+
+def test_pages_follow_rank_order_up_to_the_cap(make_app, add_catalog):
+    app = make_app({'SEARCH_MAX_CANDIDATES': 8})
+    add_catalog(app)
+    client = app.test_client()
+
+    seen, after = [], 0
+    while after is not None:
+        page = client.get(f'/search?q=news&limit=3&after={after}').get_json()
+        seen += page['items']
+        after = page['next']
+    assert len(seen) == 8
+    ranks = [item['rank'] for item in seen]
+    assert ranks == sorted(ranks)
+    assert (seen[0]['type'], seen[0]['id']) == ('subscription', 1)
+
+
+def test_search_is_scoped_to_the_token(make_app, add_episode):
+    app = make_app({'AUTH_REQUIRED': True})
+    add_episode(app, 1, title='Gardening hour', subscription_title='Weekend')
+    add_episode(app, 2, title='Private diary', subscription_title='Secret journal')
+    client = app.test_client()
+    with app.app_context():
+        tokens = {user_id: app.extensions['auth'].issue_token(user_id) for user_id in (1, 2)}
+
+    def found(q, user_id):
+        response = client.get(f'/search?q={q}',
+                              headers={'Authorization': f'Bearer {tokens[user_id]}'})
+        return [(item['type'], item['id']) for item in response.get_json()['items']]
+
+    assert client.get('/search?q=secret').status_code == 401
+    assert found('secret', 1) == []
+    assert found('diary', 1) == []
+    assert found('secret', 2) == [('subscription', 2)]
+    assert found('diary', 2) == [('podcast', 2)]
+    assert found('weekend', 1) == [('subscription', 1)]
+
+
+def test_other_users_matches_do_not_use_up_the_cap(make_app, add_episode, add_catalog):
+    app = make_app({'SEARCH_MAX_CANDIDATES': 3})
+    add_catalog(app)
+    add_episode(app, 20, title='Weather', subscription_title='Gardening')
+    with app.app_context():
+        token = app.extensions['auth'].issue_token(20)
+        db.session.add(Subscription(id=21, user_id=20, title='Tips', url='http://feed/21',
+                                    description='news', subscribed_on=datetime.datetime.utcnow()))
+        db.session.commit()
+
+    response = app.test_client().get('/search?q=news',
+                                     headers={'Authorization': f'Bearer {token}'})
+    assert [(item['type'], item['id']) for item in response.get_json()['items']] == [
+        ('subscription', 21)]
@@ -0,0 +1,39 @@
+import datetime
+
+import pytest
+
+from app.main import db
+from app.models import Subscription
+
+
+@pytest.fixture
+def app(make_app, add_episode):
+    app = make_app()
+    add_episode(app)
+    return app
+
+
+def create(app, client, path):
+    if path == '/progress':
+        return client.put('/progress/1/1', json={'progress': 5}).json['id']
+    if path == '/queue':
+        return client.post(path, json={'user_id': 1, 'podcast_id': 1}).json['id']
+    with app.app_context():
+        subscription = Subscription(user_id=1, title='Show', url='http://feed/2',
+                                    subscribed_on=datetime.datetime.utcnow())
+        db.session.add(subscription)
+        db.session.commit()
+        return subscription.id
+
+
+@pytest.mark.parametrize('path', ['/progress', '/queue', '/subscriptions'])
+def test_delete_then_insert_gets_a_new_id(app, client, path):
+    first = create(app, client, path)
+    since = client.get(f'{path}?since=0&user_id=1').json['version']
+    assert client.delete(f'{path}/{first}').status_code == 204
+    second = create(app, client, path)
+    assert second > first
+
+    delta = client.get(f'{path}?since={since}&user_id=1').json
+    assert delta['deleted'] == [first]
+    assert [row['id'] for row in delta['items']] == [second]